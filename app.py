@@ -1,12 +1,16 @@
+import asyncio
+import threading
 import yaml
 from fastapi import FastAPI
 
 from src.api.ip_whitelist import IPWhitelistMiddleware
-from src.api.routes import aistream
+from src.api.routes import aistream, metrics
 from src.mqtt.client import fast_mqtt
+from src.mqtt.publisher import DetectionPublisher
 import src.mqtt.handlers  # 必须导入，触发装饰器
 
 from src.manager.task_manager import InferenceTaskManager
+from src.manager.registry import TaskRegistry
 from src.inference.gpu_manager import GpuManager
 from config.logging_conf import setup_logger
 from src.mqtt.handlers import register_mqtt_handlers
@@ -26,10 +30,19 @@ def create_app():
             cfg = yaml.safe_load(f)
         app.state.logger=logger
         gpu_manager = GpuManager(cfg, logger)
-        task_manager = InferenceTaskManager(cfg, gpu_manager, logger)
+        publisher = DetectionPublisher(fast_mqtt, asyncio.get_running_loop(), logger,
+                                       qos=cfg.get('inference', {}).get('publish_qos', 0))
+        registry_cfg = cfg.get('registry', {})
+        registry = TaskRegistry(registry_cfg.get('path', './data/tasks.db')) \
+            if registry_cfg.get('enabled', False) else None
+        task_manager = InferenceTaskManager(cfg, gpu_manager, logger, publisher=publisher, registry=registry)
+        # 后台恢复上次运行的任务，不阻塞服务启动
+        threading.Thread(target=task_manager.restore, daemon=True).start()
 
         aistream.init(task_manager)
         app.include_router(aistream.router)
+        metrics.init(task_manager)
+        app.include_router(metrics.router)
 
     @app.on_event("shutdown")
     async def shutdown():
@@ -0,0 +1,71 @@
+"""
+跨流动态批处理基准: 多路流共享一个 detector 各自 batch=1 调用 vs BatchInferenceServer
+
+用法: python benchmarks/bench_batching.py [--model xxx.onnx] [--streams 1 2 4 8] [--seconds 5]
+不指定 --model 时生成一个动态 batch 的合成模型 (需要 onnx)
+"""
+import argparse
+import logging
+import threading
+import time
+
+import numpy as np
+
+from common import load_config, make_dummy_model
+from src.inference.batch_server import BatchInferenceServer
+from src.inference.detector import ONNXDetector
+
+
+def run_streams(infer_fn, streams, seconds, frame_shape):
+    frames = [np.random.default_rng(i).integers(0, 255, frame_shape, dtype=np.uint8) for i in range(streams)]
+    counts = [0] * streams
+    stop = threading.Event()
+
+    def worker(i):
+        while not stop.is_set():
+            infer_fn(frames[i])
+            counts[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(streams)]
+    for t in threads: t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads: t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--input-size', type=int, nargs=2, default=[640, 640])
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    model = args.model or make_dummy_model(tuple(args.input_size), dynamic_batch=True)
+    cfg = load_config(model, args.input_size)
+    logger = logging.getLogger("bench")
+
+    detector = ONNXDetector(cfg, gpu_id=-1)
+    if not detector.supports_batch:
+        print("警告: 模型不支持动态 batch，批处理模式只会串行执行")
+
+    frame_shape = (args.height, args.width, 3)
+    print(f"{'streams':>7} | {'batch=1 (fps)':>13} | {'批处理 (fps)':>12} | {'平均batch':>9} | {'提升':>6}")
+    for streams in args.streams:
+        fps_single = run_streams(detector.infer, streams, args.seconds, frame_shape)
+
+        server = BatchInferenceServer(detector, logger, -1, args.max_batch_size, args.max_wait_ms)
+        fps_batch = run_streams(server.infer, streams, args.seconds, frame_shape)
+        server.close()
+        avg_batch = server.frame_count / max(1, server.batch_count)
+
+        print(f"{streams:>7} | {fps_single:>13.1f} | {fps_batch:>12.1f} | {avg_batch:>9.2f} | {fps_batch / fps_single:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+端到端多路流压测: 不需要摄像头和流媒体服务器，普通 CPU Linux 即可运行
+
+  输入: lavfi testsrc2 生成的 60s 本地 H.264 文件，解码器以 -re -stream_loop -1 按实时速度循环读取，代替 RTSP 摄像头
+  输出: 每路一个 FFmpeg -listen 1 的 RTMP 接收端 (只解封装不解码)，代替流媒体服务器
+  推理: 与服务相同，经 GpuManager 取 detector (CPU 推理池 / 批处理服务)，每路一个 AiStreamer
+
+按 路数 x 分辨率 x 推理间隔 扫描，预热后统计:
+  每路平均/最低帧率、丢帧率、每路 CPU 占用 (本进程 + FFmpeg 子进程)、机内时延 p50/p95
+
+用法: python benchmarks/bench_e2e.py [--streams 1 2 4] [--resolutions 1280x720] [--strides 2]
+                                     [--seconds 20] [--warmup 5] [--model xxx.onnx] [--input-size 640 640]
+                                     [--pix-fmt yuv420p] [--ffmpeg-letterbox] [--tiling 2x2] [--mode layer]
+不指定 --model 时生成一个合成模型 (需要 onnx)
+任一路在统计期间没有输出帧时报错退出，可用于检查管道格式 / FFmpeg letterbox / 切片的组合是否可用
+"""
+import argparse
+import copy
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from common import load_config, make_dummy_model
+from src.core.streamer import AiStreamer
+from src.inference.gpu_manager import GpuManager
+from src.utils.metrics import Histogram
+
+WORK_DIR = '/tmp/aistream_bench'
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def make_source(ffmpeg_bin, width, height, fps, seconds=60):
+    """生成测试源文件，已存在则复用"""
+    os.makedirs(WORK_DIR, exist_ok=True)
+    path = os.path.join(WORK_DIR, f'src_{width}x{height}_{fps}.mp4')
+    if not os.path.exists(path):
+        subprocess.run([
+            ffmpeg_bin, '-v', 'error', '-y', '-f', 'lavfi',
+            '-i', f'testsrc2=size={width}x{height}:rate={fps}', '-t', str(seconds),
+            '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(fps * 2), '-bf', '0', '-pix_fmt', 'yuv420p', path,
+        ], check=True)
+    return path
+
+
+def start_sink(ffmpeg_bin, port, stream):
+    return subprocess.Popen([
+        ffmpeg_bin, '-v', 'quiet', '-listen', '1', '-f', 'flv',
+        '-i', f'rtmp://127.0.0.1:{port}/live/{stream}', '-c', 'copy', '-f', 'null', '-',
+    ])
+
+
+def process_tree_cpu(root_pid, exclude=()):
+    """root_pid 及其所有子孙进程累计的 CPU 秒数 (读 /proc)"""
+    parents, cpu = {}, {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        pid = int(name)
+        parents[pid] = int(fields[1])
+        cpu[pid] = (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+    def in_tree(pid):
+        while pid > 1:
+            if pid == root_pid:
+                return True
+            pid = parents.get(pid, 0)
+        return False
+
+    return sum(t for pid, t in cpu.items() if pid not in exclude and in_tree(pid))
+
+
+def hist_delta(after, before):
+    h = Histogram(after.bounds)
+    h.counts = [a - b for a, b in zip(after.counts, before.counts)]
+    h.count = after.count - before.count
+    h.sum = after.sum - before.sum
+    return h
+
+
+def run_case(args, model, streams, width, height, stride, port_base):
+    logger = logging.getLogger('bench_e2e')
+    cfg = load_config(model, args.input_size)
+    cfg['paths']['ffmpeg_bin'] = args.ffmpeg
+    cfg['video'].update({
+        'width': width, 'height': height, 'fps': args.fps,
+        'input_args': {'re': None, 'stream_loop': -1},
+        'pix_fmt': args.pix_fmt,
+        'ffmpeg_letterbox': args.ffmpeg_letterbox,
+    })
+    if args.tiling:
+        cols, rows = map(int, args.tiling.split('x'))
+        cfg['model']['tiling'] = {'enabled': True, 'grid': [cols, rows], 'overlap': 0.2, 'include_full': True}
+    cfg['inference'] = {'stride': stride, 'mode': args.mode}
+    cfg['reconnect'] = dict(cfg.get('reconnect', {}), enabled=False)
+    source = make_source(args.ffmpeg, width, height, args.fps)
+
+    gpu_manager = GpuManager(cfg, logger)
+    sinks, streamers, threads, gpu_ids = [], [], [], []
+    for i in range(streams):
+        detector, gpu_id = gpu_manager.acquire(f'bench-{i}')
+        if detector is None:
+            logger.warning(f"第 {i + 1} 路准入失败，按 {i} 路测试")
+            break
+        stream_cfg = copy.deepcopy(cfg)
+        stream_cfg['video']['rtmp'] = f'rtmp://127.0.0.1:{port_base + i}'
+        # 每路用不同的文件名，输出地址 /live/<文件名>_ai 各不相同
+        link = os.path.join(WORK_DIR, f's{i}_{os.path.basename(source)}')
+        if not os.path.exists(link):
+            os.symlink(source, link)
+        streamer = AiStreamer(stream_cfg, detector, logger, link, gpu_id)
+        sinks.append(start_sink(args.ffmpeg, port_base + i, streamer.stream))
+        streamers.append(streamer)
+        gpu_ids.append(gpu_id)
+    time.sleep(0.5)
+    for streamer in streamers:
+        t = threading.Thread(target=streamer.run, daemon=True)
+        t.start()
+        threads.append(t)
+
+    sink_pids = {s.pid for s in sinks}
+    time.sleep(args.warmup)
+    frames0 = [s.metrics.frames for s in streamers]
+    drops0 = [s.metrics.drops for s in streamers]
+    lat0 = [copy.deepcopy(s.metrics.stages['latency']) for s in streamers]
+    cpu0, t0 = process_tree_cpu(os.getpid(), sink_pids), time.perf_counter()
+
+    time.sleep(args.seconds)
+
+    cpu1, t1 = process_tree_cpu(os.getpid(), sink_pids), time.perf_counter()
+    wall = t1 - t0
+    fps = [(s.metrics.frames - f0) / wall for s, f0 in zip(streamers, frames0)]
+    frames = sum(s.metrics.frames for s in streamers) - sum(frames0)
+    drops = sum(s.metrics.drops for s in streamers) - sum(drops0)
+    latency = Histogram()
+    for s, before in zip(streamers, lat0):
+        latency.merge(hist_delta(s.metrics.stages['latency'], before))
+
+    for streamer in streamers:
+        streamer.running = False
+    for t in threads:
+        t.join(timeout=15)
+    for sink in sinks:
+        sink.kill()
+        sink.wait()
+    for i, gpu_id in enumerate(gpu_ids):
+        gpu_manager.release(gpu_id, f'bench-{i}')
+
+    stalled = [i for i, (s, f0) in enumerate(zip(streamers, frames0)) if s.metrics.frames == f0]
+    if stalled:
+        raise RuntimeError(f"第 {stalled} 路统计期间没有输出帧 (pix_fmt={args.pix_fmt}, "
+                           f"ffmpeg_letterbox={args.ffmpeg_letterbox}, tiling={args.tiling})")
+
+    n = max(1, len(streamers))
+    return {
+        'streams': len(streamers),
+        'fps_avg': sum(fps) / n,
+        'fps_min': min(fps) if fps else 0.0,
+        'drop_rate': drops / max(1, frames + drops),
+        'cpu_per_stream': (cpu1 - cpu0) / wall / n * 100,
+        'lat_p50': latency.quantile(0.5),
+        'lat_p95': latency.quantile(0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--input-size', type=int, nargs=2, default=[640, 640])
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--resolutions', nargs='+', default=['1280x720'])
+    parser.add_argument('--strides', type=int, nargs='+', default=[2])
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--pix-fmt', default='rgb24')
+    parser.add_argument('--ffmpeg-letterbox', action='store_true', help='由 FFmpeg 输出模型输入')
+    parser.add_argument('--tiling', default=None, help='切片网格，例如 2x2')
+    parser.add_argument('--mode', default='overlay', choices=['overlay', 'sidecar', 'layer'],
+                        help='sidecar/layer 下平均帧率为推理帧率')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--port', type=int, default=19400, help='RTMP 接收端起始端口，每路占一个')
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    model = args.model or make_dummy_model(tuple(args.input_size), dynamic_batch=True)
+
+    print(f"CPU 核数: {os.cpu_count()}  源帧率: {args.fps}  管道格式: {args.pix_fmt}")
+    print(f"{'路数':>4} | {'分辨率':>9} | {'间隔':>4} | {'平均fps':>7} | {'最低fps':>7} | "
+          f"{'丢帧率':>6} | {'CPU%/路':>7} | {'时延p50':>7} | {'时延p95':>7}")
+    for resolution in args.resolutions:
+        width, height = map(int, resolution.split('x'))
+        for stride in args.strides:
+            for streams in args.streams:
+                r = run_case(args, model, streams, width, height, stride, args.port)
+                print(f"{r['streams']:>4} | {resolution:>9} | {stride:>4} | {r['fps_avg']:>7.1f} | "
+                      f"{r['fps_min']:>7.1f} | {r['drop_rate']:>6.1%} | {r['cpu_per_stream']:>7.1f} | "
+                      f"{r['lat_p50']:>7.1f} | {r['lat_p95']:>7.1f}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+读线程 -> 处理线程帧传递基准: 原 bytes + Queue + frombuffer().copy() vs FrameRing + readinto
+
+用 FFmpeg lavfi 合成源 (不限速) 作为解码器，处理线程只做一次轻量写入模拟绘图
+输出吞吐、每帧缺页次数 (新分配的大块内存首次写入会触发缺页) 和 tracemalloc 峰值
+
+用法: python benchmarks/bench_frame_ring.py [--ffmpeg ffmpeg] [--frames 500] [--size 1280x720]
+"""
+import argparse
+import queue
+import resource
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from common import ROOT  # noqa: F401  (把仓库根目录加入 sys.path)
+from src.core.frame_ring import FrameRing, read_into
+
+
+def spawn_source(ffmpeg_bin, w, h, frames):
+    args = [
+        ffmpeg_bin, '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={w}x{h}:rate=25',
+        '-frames:v', str(frames), '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1',
+    ]
+    return subprocess.Popen(args, stdout=subprocess.PIPE)
+
+
+def run_legacy(ffmpeg_bin, w, h, frames):
+    frame_size = w * h * 3
+    q = queue.Queue(maxsize=3)
+    done = threading.Event()
+    proc = spawn_source(ffmpeg_bin, w, h, frames)
+
+    def reader():
+        while True:
+            raw = proc.stdout.read(frame_size)
+            if not raw:
+                break
+            if q.full():
+                q.get()
+            q.put(raw)
+        done.set()
+
+    processed = 0
+    t = threading.Thread(target=reader, daemon=True)
+    t.start()
+    while not (done.is_set() and q.empty()):
+        try:
+            raw = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        frame = np.frombuffer(raw, np.uint8).reshape([h, w, 3]).copy()
+        frame[0, 0] = 255
+        processed += 1
+    t.join()
+    proc.wait()
+    return processed
+
+
+def run_ring(ffmpeg_bin, w, h, frames):
+    ring = FrameRing([(h, w, 3)], slots=4)
+    proc = spawn_source(ffmpeg_bin, w, h, frames)
+
+    def reader():
+        while True:
+            slot = ring.acquire_write()
+            if slot is None:
+                time.sleep(0.001)
+                continue
+            idx, buffers = slot
+            if not read_into(proc.stdout, buffers[0]):
+                ring.abort_write(idx)
+                break
+            ring.publish(idx)
+        ring.close()
+
+    processed = 0
+    t = threading.Thread(target=reader, daemon=True)
+    t.start()
+    while True:
+        slot = ring.acquire_latest(timeout=0.1)
+        if slot is None:
+            if ring.closed:
+                break
+            continue
+        idx, buffers, _, _ = slot
+        buffers[0][0, 0] = 255
+        processed += 1
+        ring.release(idx)
+    t.join()
+    proc.wait()
+    return processed
+
+
+def measure(name, fn, *args):
+    tracemalloc.start()
+    flt0 = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    t0 = time.perf_counter()
+    processed = fn(*args)
+    cost = time.perf_counter() - t0
+    flt = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - flt0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>8} | 处理 {processed:>5} 帧 | {processed / cost:>7.1f} fps | "
+          f"缺页/帧 {flt / max(1, processed):>7.1f} | 内存峰值 {peak / 1024 / 1024:>6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--size', default='1280x720')
+    args = parser.parse_args()
+    w, h = map(int, args.size.split('x'))
+
+    measure('legacy', run_legacy, args.ffmpeg, w, h, args.frames)
+    measure('ring', run_ring, args.ffmpeg, w, h, args.frames)
+
+
+if __name__ == '__main__':
+    main()
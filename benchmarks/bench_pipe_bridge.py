@@ -0,0 +1,129 @@
+"""
+Ascend 推流中转基准: 用 CPU FFmpeg (libx264 输出 H.264 裸流) 代替 h264_ascend 编码器，
+对比两个 FFmpeg 之间的几种中转方式:
+  read4k  原实现: Python 线程 read(4096)/write
+  read1m  扩大管道 + 1MB 大块读写
+  splice  扩大管道 + os.splice 零拷贝
+  direct  编码器 stdout 直接作为封装进程 stdin (当前实现)
+输出总耗时、吞吐和中转线程占用的 CPU 时间
+
+用法: python benchmarks/bench_pipe_bridge.py [--frames 500] [--size 1280x720] [--qp 10]
+qp 越小码流越大，越能体现中转开销
+"""
+import argparse
+import os
+import subprocess
+import threading
+import time
+
+from common import ROOT  # noqa: F401  (把仓库根目录加入 sys.path)
+from src.core.pipes import enlarge_pipe, pipe_size
+
+
+def splice_relay(src, dst, chunk=1 << 20):
+    """
+    管道到管道零拷贝转发 (os.splice，Python 3.10+ / Linux)，不支持时退回大块 read/write
+    返回转发的字节数
+    """
+    src_fd = src if isinstance(src, int) else src.fileno()
+    dst_fd = dst if isinstance(dst, int) else dst.fileno()
+    total = 0
+    if hasattr(os, 'splice'):
+        while True:
+            n = os.splice(src_fd, dst_fd, chunk)
+            if not n:
+                return total
+            total += n
+    while True:
+        data = os.read(src_fd, chunk)
+        if not data:
+            return total
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        total += len(data)
+
+
+def relay_read(src, dst, chunk, stats):
+    t0 = time.thread_time()
+    total = 0
+    while True:
+        data = src.read(chunk)
+        if not data:
+            break
+        dst.write(data)
+        total += len(data)
+    dst.close()
+    stats['cpu'] = time.thread_time() - t0
+    stats['bytes'] = total
+
+
+def relay_splice(src, dst, stats):
+    t0 = time.thread_time()
+    stats['bytes'] = splice_relay(src, dst)
+    dst.close()
+    stats['cpu'] = time.thread_time() - t0
+
+
+def run(mode, args):
+    producer_cmd = [
+        args.ffmpeg, '-v', 'error', '-f', 'lavfi',
+        '-i', f'testsrc2=size={args.size}:rate=25', '-frames:v', str(args.frames),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-qp', str(args.qp),
+        '-f', 'h264', 'pipe:',
+    ]
+    consumer_cmd = [args.ffmpeg, '-v', 'error', '-f', 'h264', '-i', 'pipe:', '-c', 'copy', '-f', 'null', '-']
+    stats = {'cpu': 0.0, 'bytes': 0}
+
+    t0 = time.perf_counter()
+    producer = subprocess.Popen(producer_cmd, stdout=subprocess.PIPE)
+    if mode == 'direct':
+        enlarge_pipe(producer.stdout)
+        consumer = subprocess.Popen(consumer_cmd, stdin=producer.stdout)
+        producer.stdout.close()
+        thread = None
+    else:
+        consumer = subprocess.Popen(consumer_cmd, stdin=subprocess.PIPE)
+        if mode == 'read4k':
+            thread = threading.Thread(target=relay_read, args=(producer.stdout, consumer.stdin, 4096, stats))
+        else:
+            enlarge_pipe(producer.stdout)
+            enlarge_pipe(consumer.stdin)
+            if mode == 'read1m':
+                thread = threading.Thread(target=relay_read, args=(producer.stdout, consumer.stdin, 1 << 20, stats))
+            else:
+                thread = threading.Thread(target=relay_splice, args=(producer.stdout, consumer.stdin, stats))
+        thread.start()
+
+    producer.wait()
+    if thread is not None:
+        thread.join()
+    consumer.wait()
+    return time.perf_counter() - t0, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--qp', type=int, default=10)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--modes', nargs='+', default=['read4k', 'read1m', 'splice', 'direct'])
+    args = parser.parse_args()
+
+    r, w = os.pipe()
+    print(f"管道缓冲: 默认 {pipe_size(r) // 1024}KB -> 扩大后 {(enlarge_pipe(r) or 0) // 1024}KB")
+    os.close(r)
+    os.close(w)
+
+    print(f"{'方式':>8} | {'总耗时(s)':>9} | {'码流(MB)':>8} | {'吞吐(MB/s)':>10} | {'中转CPU(ms)':>11}")
+    for mode in args.modes:
+        wall, stats = run(mode, args)
+        mb = stats['bytes'] / 1024 / 1024
+        rate = f"{mb / wall:>10.1f}" if stats['bytes'] else f"{'-':>10}"
+        size = f"{mb:>8.1f}" if stats['bytes'] else f"{'-':>8}"
+        print(f"{mode:>8} | {wall:>9.2f} | {size} | {rate} | {stats['cpu'] * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
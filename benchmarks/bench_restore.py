@@ -0,0 +1,87 @@
+"""
+重启恢复压测: 往任务登记表写入 N 路任务，按服务启动时的流程恢复，统计各阶段耗时
+
+  输入: 与 bench_e2e 相同的本地 H.264 文件 (-re -stream_loop -1 循环读取)，每路一个软链接代替 RTSP 地址
+  模式: 旁路模式 (sidecar)，不推流，不需要 RTMP 接收端；出第一帧检测结果即视为就绪
+  流程: InferenceTaskManager.restore() —— 预热推理后端 -> 整批准入 -> 间隔 stagger_ms 逐路启动 -> 等待出帧
+
+按 路数 x 启动间隔 扫描，输出: 恢复/出帧/失败路数、预热耗时、全部启动耗时、全部出帧耗时、总耗时
+CPU 环境下受 cpu_pool 实测容量准入限制，超出容量的路数计入失败
+
+用法: python benchmarks/bench_restore.py [--streams 50 200] [--stagger-ms 0 20] [--resolution 640x360]
+                                         [--model xxx.onnx] [--input-size 640 640]
+"""
+import argparse
+import logging
+import os
+import time
+
+from bench_e2e import WORK_DIR, make_source
+from common import load_config, make_dummy_model
+from src.inference.gpu_manager import GpuManager
+from src.manager.registry import TaskRegistry
+from src.manager.task_manager import InferenceTaskManager
+
+
+def run_case(args, model, streams, stagger_ms, width, height):
+    logger = logging.getLogger('bench_restore')
+    cfg = load_config(model, args.input_size)
+    cfg['paths']['ffmpeg_bin'] = args.ffmpeg
+    cfg['video'].update({
+        'width': width, 'height': height, 'fps': args.fps,
+        'input_args': {'re': None, 'stream_loop': -1},
+    })
+    cfg['reconnect'] = dict(cfg.get('reconnect', {}), enabled=False)
+    cfg['registry'] = {'stagger_ms': stagger_ms, 'ready_timeout_s': args.timeout}
+    source = make_source(args.ffmpeg, width, height, args.fps)
+
+    path = os.path.join(WORK_DIR, 'restore.db')
+    if os.path.exists(path):
+        os.remove(path)
+    registry = TaskRegistry(path)
+    specs = []
+    for i in range(streams):
+        link = os.path.join(WORK_DIR, f's{i}_{os.path.basename(source)}')
+        if not os.path.exists(link):
+            os.symlink(source, link)
+        specs.append((f'bench-{i}', link, {'mode': 'sidecar'}))
+    registry.add(specs)
+
+    manager = InferenceTaskManager(cfg, GpuManager(cfg, logger), logger, registry=registry)
+    stats = manager.restore()
+    manager.stop_all()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--input-size', type=int, nargs=2, default=[640, 640])
+    parser.add_argument('--streams', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--stagger-ms', type=float, nargs='+', default=[0, 20])
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--timeout', type=float, default=60, help='等待各路出第一帧的最长时间 (s)')
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    model = args.model or make_dummy_model(tuple(args.input_size), dynamic_batch=True)
+    width, height = map(int, args.resolution.split('x'))
+
+    print(f"CPU 核数: {os.cpu_count()}  分辨率: {args.resolution}  源帧率: {args.fps}")
+    print(f"{'路数':>4} | {'间隔ms':>6} | {'恢复':>4} | {'出帧':>4} | {'失败':>4} | "
+          f"{'预热s':>6} | {'启动s':>6} | {'出帧s':>6} | {'总耗时s':>7}")
+    for streams in args.streams:
+        for stagger_ms in args.stagger_ms:
+            r = run_case(args, model, streams, stagger_ms, width, height)
+            print(f"{streams:>4} | {stagger_ms:>6.0f} | {r['restored']:>4} | {r['ready']:>4} | {r['failed']:>4} | "
+                  f"{r['prewarm_s']:>6.2f} | {r['start_s']:>6.2f} | {r['ready_s']:>6.2f} | "
+                  f"{r['elapsed_s']:>7.2f}", flush=True)
+            # 等上一轮的 FFmpeg 进程退出
+            time.sleep(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+切片推理吞吐基准: 不同切片数下单帧耗时与帧率
+
+用法: python benchmarks/bench_tiling.py [--model xxx.onnx] [--input-size 640 640] [--grids 2x1 2x2 3x2 3x3]
+不指定 --model 时生成一个动态 batch 的合成模型 (需要 onnx)
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import load_config, make_dummy_model
+from src.inference.detector import ONNXDetector
+
+
+def bench(detector, frame, seconds):
+    detector.infer(frame)
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        detector.infer(frame)
+        n += 1
+    cost = time.perf_counter() - t0
+    return cost / n * 1000, n / cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--input-size', type=int, nargs=2, default=[640, 640])
+    parser.add_argument('--grids', nargs='+', default=['2x1', '2x2', '3x2', '3x3'])
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--no-full', action='store_true', help='不额外推理整帧')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    model = args.model or make_dummy_model(tuple(args.input_size), dynamic_batch=True)
+    frame = np.random.default_rng(0).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+
+    print(f"{'切片':>6} | {'输入数':>6} | {'单帧(ms)':>9} | {'帧率(fps)':>9}")
+    cfg = load_config(model, args.input_size)
+    ms, fps = bench(ONNXDetector(cfg, gpu_id=-1), frame, args.seconds)
+    print(f"{'整帧':>6} | {1:>6} | {ms:>9.1f} | {fps:>9.1f}")
+
+    for grid in args.grids:
+        cols, rows = map(int, grid.split('x'))
+        cfg = load_config(model, args.input_size)
+        cfg['model']['tiling'] = {
+            'enabled': True, 'grid': [cols, rows],
+            'overlap': args.overlap, 'include_full': not args.no_full,
+        }
+        detector = ONNXDetector(cfg, gpu_id=-1)
+        n_inputs = len(detector.tile_regions(args.height, args.width))
+        ms, fps = bench(detector, frame, args.seconds)
+        print(f"{grid:>6} | {n_inputs:>6} | {ms:>9.1f} | {fps:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
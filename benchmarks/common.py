@@ -0,0 +1,69 @@
+"""
+基准脚本公用工具: 生成合成 ONNX 模型、构造最小配置
+合成模型需要额外安装 onnx (pip install onnx)，也可以用 --model 指定真实模型
+"""
+import copy
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_dummy_model(input_size=(960, 960), num_classes=10, stride=8, dynamic_batch=True, path=None):
+    """
+    生成一个输出格式与 YOLOv5 一致的小模型:
+    [B, 3, H, W] -Conv(stride)-> [B, 5+C, H/s, W/s] -> [B, N, 5+C] (Sigmoid)
+    """
+    import numpy as np
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    h, w = input_size
+    ch = 5 + num_classes
+    n = (h // stride) * (w // stride)
+    batch = 'batch' if dynamic_batch else 1
+
+    rng = np.random.default_rng(0)
+    weight = numpy_helper.from_array(
+        (rng.standard_normal((ch, 3, stride, stride)) * 0.05).astype(np.float32), 'w')
+    shape = numpy_helper.from_array(np.array([0, ch, n], dtype=np.int64), 'shape')
+
+    nodes = [
+        helper.make_node('Conv', ['images', 'w'], ['conv'], kernel_shape=[stride, stride], strides=[stride, stride]),
+        helper.make_node('Reshape', ['conv', 'shape'], ['flat']),
+        helper.make_node('Transpose', ['flat'], ['trans'], perm=[0, 2, 1]),
+        helper.make_node('Sigmoid', ['trans'], ['output0']),
+    ]
+    graph = helper.make_graph(
+        nodes, 'dummy_yolo',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, [batch, 3, h, w])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [batch, n, ch])],
+        initializer=[weight, shape],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.onnx')
+        os.close(fd)
+    onnx.save(model, path)
+    return path
+
+
+def load_config(model_path=None, input_size=None, **overrides):
+    """读取 config/settings.yaml，并切到 cpu 环境，覆盖模型路径等"""
+    import yaml
+
+    with open(os.path.join(ROOT, 'config', 'settings.yaml')) as f:
+        cfg = yaml.safe_load(f)
+    cfg = copy.deepcopy(cfg)
+    cfg['device_type'] = 'cpu'
+    if model_path:
+        cfg['model']['path'] = model_path
+    if input_size:
+        cfg['model']['input_size'] = list(input_size)
+    for key, value in overrides.items():
+        cfg[key] = value
+    return cfg
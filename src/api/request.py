@@ -1,7 +1,26 @@
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 class StartTaskRequest(BaseModel):
     input_url: str
+    # 以下为任务级参数，不填使用 settings.yaml 中的配置
+    infer_stride: Optional[int] = Field(None, ge=1, le=25)  # 每 N 帧推理一次
+    motion_gate: Optional[bool] = None  # 静止画面跳过推理
+    mode: Optional[Literal['overlay', 'sidecar', 'layer']] = None  # sidecar: 只发布检测结果，不推流；layer: FFmpeg 内叠加
+    decode_mode: Optional[Literal['all', 'rate', 'keyframe']] = None  # 解码器输出哪些帧
+
+    def options(self):
+        return self.model_dump(exclude={'input_url'}, exclude_none=True)
 
 class StopTaskRequest(BaseModel):
     task_id: str
+
+class BatchStartRequest(BaseModel):
+    items: List[StartTaskRequest] = Field(..., min_length=1, max_length=1000)
+
+class BatchTaskIdsRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+class MigrateTaskRequest(BaseModel):
+    task_id: str
+    gpu_id: Optional[int] = None  # 目标设备，不填自动选择剩余能力最多的设备
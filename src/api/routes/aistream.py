@@ -1,6 +1,9 @@
+from typing import Optional
+
 from fastapi import APIRouter
 from src.api.response import ApiResponse
-from src.api.request import StartTaskRequest, StopTaskRequest
+from src.api.request import (BatchStartRequest, BatchTaskIdsRequest, MigrateTaskRequest, StartTaskRequest,
+                             StopTaskRequest)
 from src.manager.task_manager import InferenceTaskManager
 
 router = APIRouter(prefix="/aistream")
@@ -14,12 +17,12 @@ def init(manager: InferenceTaskManager):
 @router.post("/start")
 def start_task(req: StartTaskRequest):
     try:
-        task_id = task_manager.start_task(req.input_url)
+        task_id = task_manager.start_task(req.input_url, req.options())
         return ApiResponse.ok({
             "task_id": task_id
         })
     except Exception as e:
-        logger.exception("开启任务失败")
+        task_manager.logger.exception("开启任务失败")
         return ApiResponse.fail(str(e), code=500)
 
 @router.post("/stop")
@@ -30,6 +33,42 @@ def stop_task(req: StopTaskRequest):
     return ApiResponse.fail("停止失败或任务不存在", code=404)
 
 
+@router.post("/start/batch")
+def start_tasks(req: BatchStartRequest):
+    results = task_manager.start_tasks([(item.input_url, item.options()) for item in req.items])
+    return ApiResponse.ok({
+        "started": sum(r["success"] for r in results),
+        "failed": sum(not r["success"] for r in results),
+        "results": results
+    })
+
+@router.post("/stop/batch")
+def stop_tasks(req: BatchTaskIdsRequest):
+    results = task_manager.stop_tasks(req.task_ids)
+    return ApiResponse.ok({
+        "stopped": sum(r["success"] for r in results),
+        "results": results
+    })
+
+@router.post("/status/batch")
+def get_statuses(req: BatchTaskIdsRequest):
+    return ApiResponse.ok(task_manager.get_statuses(req.task_ids))
+
+
+@router.post("/migrate")
+def migrate_task(req: MigrateTaskRequest):
+    try:
+        source, target = task_manager.migrate_task(req.task_id, req.gpu_id)
+        return ApiResponse.ok({
+            "task_id": req.task_id,
+            "from_gpu_id": source,
+            "gpu_id": target
+        })
+    except Exception as e:
+        task_manager.logger.exception("迁移任务失败")
+        return ApiResponse.fail(str(e), code=500)
+
+
 @router.get("/status")
 def get_status(task_id: str):
     status = task_manager.get_status(task_id)
@@ -38,5 +77,5 @@ def get_status(task_id: str):
     return ApiResponse.ok(status)
 
 @router.get("/tasks")
-def list_tasks():
-    return ApiResponse.ok(task_manager.list_tasks())
+def list_tasks(gpu_id: Optional[int] = None, stream: Optional[str] = None):
+    return ApiResponse.ok(task_manager.list_tasks(gpu_id, stream))
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.manager.task_manager import InferenceTaskManager
+from src.utils.metrics import render_prometheus
+
+router = APIRouter()
+
+task_manager: InferenceTaskManager = None
+
+def init(manager: InferenceTaskManager):
+    global task_manager
+    task_manager = manager
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    streams, devices = task_manager.collect_metrics()
+    return PlainTextResponse(render_prometheus(streams, devices), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,5 @@
+from src.inference.detector import letterbox_params
+
 #cpu环境
 def _get_cpu_config(cfg):
     input_args = {
@@ -124,12 +126,34 @@ def _get_ascend_config(cfg,gpu_id=0):
 
 
 
-def get_ffmpeg_args(cfg, gpu_id=0):
+def get_ffmpeg_args(cfg, gpu_id=0, input_url=None, output_url=None):
     device_type = cfg.get('device_type', 'cpu').lower()
     
     if device_type == 'nvidia':
-        return _get_nvidia_config(cfg,gpu_id)
+        input_args, output_args = _get_nvidia_config(cfg,gpu_id)
     elif device_type == 'ascend':
-        return _get_ascend_config(cfg,gpu_id)
+        input_args, output_args = _get_ascend_config(cfg,gpu_id)
     else:
-        return _get_cpu_config(cfg)
\ No newline at end of file
+        input_args, output_args = _get_cpu_config(cfg)
+
+    # 非 RTSP 输入 (本地文件、测试源等) 不能带 rtsp_transport
+    if input_url and not input_url.startswith('rtsp://'):
+        input_args.pop('rtsp_transport', None)
+    # 额外的输入参数，例如压测时循环读取本地文件: {re: null, stream_loop: -1}
+    input_args.update(cfg['video'].get('input_args') or {})
+
+    # 按推流地址选择封装格式，rtsp 格式不能推到 rtmp 地址
+    if output_url and output_args.get('format') == 'rtsp' and not output_url.startswith('rtsp://'):
+        output_args['format'] = 'flv'
+        output_args.pop('rtsp_transport', None)
+    return input_args, output_args
+
+
+def get_letterbox_size(cfg):
+    """
+    FFmpeg 内完成 letterbox 时的参数，与 ONNXDetector.preprocess 保持一致
+    返回 (缩放宽, 缩放高, 模型宽, 模型高, 左填充, 上填充)
+    """
+    in_h, in_w = cfg['model']['input_size']
+    _, (new_w, new_h), dw, dh = letterbox_params(cfg['video']['height'], cfg['video']['width'], (in_h, in_w))
+    return new_w, new_h, in_w, in_h, int(round(dw - 0.1)), int(round(dh - 0.1))
@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+FREE, WRITING, READY, READING = range(4)
+
+
+class FrameRing:
+    """
+    预分配的 N 槽帧缓冲，读线程 readinto 直接写入槽位，处理线程原地使用，稳态下不再分配内存
+    最新帧优先: 新帧写满后，尚未被取走的旧帧直接回收，计入丢帧
+    每个槽位可包含多块缓冲 (例如原始帧 + 模型输入)，由 shapes 指定
+    """
+
+    def __init__(self, shapes, slots=4):
+        # 写线程 1 槽、待取 1 槽、处理线程 1 槽，至少需要 3 槽才能保证写线程不等待
+        slots = max(3, slots)
+        self.buffers = [tuple(np.empty(shape, dtype=np.uint8) for shape in shapes) for _ in range(slots)]
+        self.meta = [None] * slots
+        self.state = [FREE] * slots
+        self.free = deque(range(slots))
+        self.latest = None
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def acquire_write(self):
+        """返回 (槽号, 缓冲元组)，无空闲槽 (处理线程持有过多) 时返回 None"""
+        with self.cond:
+            if not self.free:
+                return None
+            idx = self.free.popleft()
+            self.state[idx] = WRITING
+            return idx, self.buffers[idx]
+
+    def publish(self, idx, meta=None):
+        with self.cond:
+            assert self.state[idx] == WRITING
+            if self.latest is not None:
+                # 上一帧还没被取走，直接丢弃
+                self._recycle(self.latest)
+                self.dropped += 1
+            self.meta[idx] = meta
+            self.state[idx] = READY
+            self.latest = idx
+            self.cond.notify()
+
+    def abort_write(self, idx):
+        with self.cond:
+            assert self.state[idx] == WRITING
+            self._recycle(idx)
+
+    def acquire_latest(self, timeout=None):
+        """
+        取最新一帧: 返回 (槽号, 缓冲元组, meta, 自上次取帧以来丢弃的帧数)
+        超时或已关闭返回 None
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.latest is not None or self.closed, timeout):
+                return None
+            if self.latest is None:
+                return None
+            idx, self.latest = self.latest, None
+            self.state[idx] = READING
+            dropped, self.dropped = self.dropped, 0
+            return idx, self.buffers[idx], self.meta[idx], dropped
+
+    def release(self, idx):
+        with self.cond:
+            assert self.state[idx] == READING
+            self._recycle(idx)
+
+    def pending(self):
+        with self.cond:
+            return 0 if self.latest is None else 1
+
+    def in_use(self):
+        """非空闲槽位数 (写入中 + 待取 + 处理中)"""
+        return len(self.state) - len(self.free)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _recycle(self, idx):
+        self.state[idx] = FREE
+        self.meta[idx] = None
+        self.free.append(idx)
+
+
+def read_into(pipe, buf):
+    """从管道读满 buf (numpy 数组)，EOF 返回 False"""
+    view = memoryview(buf).cast('B')
+    pos, size = 0, len(view)
+    while pos < size:
+        n = pipe.readinto(view[pos:])
+        if not n:
+            return False
+        pos += n
+    return True
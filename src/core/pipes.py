@@ -0,0 +1,47 @@
+import fcntl
+
+# Linux 专有，旧版 Python 的 fcntl 模块没有导出这两个常量
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+F_GETPIPE_SZ = getattr(fcntl, 'F_GETPIPE_SZ', 1032)
+
+
+def pipe_max_size():
+    try:
+        with open('/proc/sys/fs/pipe-max-size') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 1 << 20
+
+
+# 单个管道缓冲上限: 非 root 用户所有管道共享 pipe-user-pages-soft (默认 64MB)，
+# 按系统上限 (1MB) 分配时约 30 路流就会耗尽，超出后新管道只有一页缓冲
+PIPE_SIZE_CAP = 256 << 10
+
+_enlarge_failed = False
+
+
+def enlarge_pipe(pipe, size=None, logger=None):
+    """
+    扩大管道内核缓冲 (默认 64KB)，减少 FFmpeg 与 Python 之间每帧的读写次数和上下文切换
+    pipe 可以是文件对象或 fd，size 一般传一帧的字节数，不超过 PIPE_SIZE_CAP 和系统上限
+    返回实际大小，不支持或超出用户配额时返回 None，只记录一次日志
+    """
+    global _enlarge_failed
+    fd = pipe if isinstance(pipe, int) else pipe.fileno()
+    size = min(size or PIPE_SIZE_CAP, PIPE_SIZE_CAP, pipe_max_size())
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError as e:
+        if logger is not None and not _enlarge_failed:
+            _enlarge_failed = True
+            logger.warning(f"扩大管道缓冲到 {size // 1024}KB 失败 (可能超出 pipe-user-pages-soft): {e}，沿用默认缓冲")
+        return None
+
+
+def pipe_size(pipe):
+    fd = pipe if isinstance(pipe, int) else pipe.fileno()
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except OSError:
+        return None
+
@@ -1,160 +1,693 @@
 import ffmpeg
 import numpy as np
+import os
+import random
+import re
+import subprocess
 import threading
-import queue
-from src.core.ffmpeg_cfg import get_ffmpeg_args
+from src.core.ffmpeg_cfg import get_ffmpeg_args, get_letterbox_size
+from src.core.frame_ring import FrameRing, read_into
+from src.core.pipes import enlarge_pipe
+from src.core.stride_controller import StrideController
+from src.core.timestamps import PtsReader, SourceClock
+from src.inference.detector import letterbox, letterbox_params, planar_to_blob
+from src.inference.motion import MotionGate
+from src.inference.tracker import Tracker
 import cv2
 import datetime
 import time
-from src.utils.drawer import Drawer
+from src.utils.drawer import Drawer, OverlayCache
+from src.utils.metrics import StreamMetrics
+from src.utils.yuv import PIPE_FORMATS, TO_RGB, YuvDownscaler, frame_shape
+
+MODES = ('overlay', 'sidecar', 'layer')
+DECODE_MODES = ('all', 'rate', 'keyframe')
+
+
+FPS_RE = re.compile(r'Video:.*?(\d+(?:\.\d+)?)(k?) (fps|tbr)')
+
+
+def probe_fps(ffmpeg_bin, url, rtsp_transport=None, timeout=10):
+    """
+    探测源流帧率: 只打开输入 (ffmpeg -i)，从流信息中解析 fps (没有时取 tbr)，失败返回 None
+    部署环境只配置了 ffmpeg，不依赖 ffprobe
+    """
+    args = [ffmpeg_bin, '-hide_banner']
+    if rtsp_transport and url.startswith('rtsp://'):
+        args += ['-rtsp_transport', rtsp_transport]
+    try:
+        result = subprocess.run(args + ['-i', url], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    rates = {}
+    for value, k, kind in FPS_RE.findall(result.stderr.decode('utf-8', errors='replace')):
+        rates.setdefault(kind, float(value) * (1000 if k else 1))
+    fps = rates.get('fps') or rates.get('tbr')
+    return fps if fps and 0 < fps <= 240 else None
+
+
+def stream_name(input_url):
+    """输出流名: 输入地址最后一段加 _ai，推流地址 /live/<stream> 和 MQTT 主题都用它"""
+    return input_url.split('/')[-1].split('?')[0] + '_ai'
+
 
 class AiStreamer:
-    def __init__(self, config, detector, logger,input_url,gpu_id):
+    def __init__(self, config, detector, logger,input_url,gpu_id,options=None,publisher=None):
         self.cfg = config
+        self.options = options or {}
+        self.publisher = publisher
+        # 旁路模式 (sidecar): 不绘制、不编码，解码器只按推理帧率输出缩小的帧，
+        # 检测结果带源时间戳经 MQTT 发布，原始流由流媒体服务直接转发
+        # 图层模式 (layer): 解码、叠加、编码都在同一个 FFmpeg 进程内完成，
+        # Python 只接收推理用的小图，回传低分辨率 RGBA 检测图层
+        self.mode = self.options.get('mode') or config.get('inference', {}).get('mode', 'overlay')
+        if self.mode not in MODES:
+            raise ValueError(f"不支持的 mode: {self.mode}，可选 {MODES}")
+        if self.mode == 'layer' and config.get('device_type', 'cpu').lower() == 'ascend':
+            # Ascend 编码器输出裸流，需要单独的封装进程推流
+            raise ValueError("layer 模式暂不支持 ascend")
+        self.sidecar = self.mode == 'sidecar'
+        # 管道只传推理用的小图，原始分辨率的帧不出 FFmpeg
+        self.infer_pipe = self.mode in ('sidecar', 'layer')
         self.detector = detector
         self.logger = logger
-        self.frame_queue = queue.Queue(maxsize=3)
         self.running = True
         self.input_url=input_url
         stream_suffix = input_url.split('/')[-1].split('?')[0]
         self.output_url = input_url.replace("rtsp://", "rtmp://") + "_ai"
         rtmp_base = config['video'].get('rtmp', 'rtmp://127.0.0.1:1935')
         base_url = rtmp_base.rstrip('/')
-        self.output_url = f"{base_url}/live/{stream_suffix}_ai"
+        self.output_url = "" if self.sidecar else f"{base_url}/live/{stream_suffix}_ai"
         self.w = config['video']['width']
         self.h = config['video']['height']
-        self.frame_size = self.w * self.h * 3
+        # 管道像素格式: yuv420p/nv12 每像素 1.5 字节，管道带宽和拷贝量减半，
+        # 只把缩小后的推理输入转成 RGB，检测框直接画在 Y/UV 平面上
+        self.pix_fmt = 'rgb24' if self.infer_pipe else config['video'].get('pix_fmt', 'rgb24')
+        if self.pix_fmt not in PIPE_FORMATS:
+            raise ValueError(f"不支持的 pix_fmt: {self.pix_fmt}，可选 {PIPE_FORMATS}")
+        self.frame_shape = frame_shape(self.h, self.w, self.pix_fmt)
+        in_h, in_w = config['model']['input_size']
+        self.decode_size = None
+        if self.infer_pipe:
+            if config['model'].get('tiling', {}).get('enabled', False):
+                # 切片要在原分辨率上进行才能找到小目标，解码器不缩放
+                self.decode_size = (self.w, self.h)
+            else:
+                # 解码器直接缩放到 letterbox 尺寸，管道里只有推理用的小图
+                _, (new_w, new_h), _, _ = letterbox_params(self.h, self.w, (in_h, in_w))
+                self.decode_size = (min(self.w, new_w) // 2 * 2, min(self.h, new_h) // 2 * 2)
+            self.frame_shape = (self.decode_size[1], self.decode_size[0], 3)
+        self.frame_size = int(np.prod(self.frame_shape))
         self.drawer = Drawer(config)
         self.gpu_id=gpu_id
         self.fps=0
-        self.stream=f"{stream_suffix}_ai"
+        self.stats = {}
+        # 各阶段耗时直方图，处理线程单线程写入，/metrics 读取
+        self.metrics = StreamMetrics()
+        self.stream = stream_name(input_url)
         self.last_heartbeat = time.time()
 
-    def _reader(self):
-        in_args, _ = get_ffmpeg_args(self.cfg,self.gpu_id)
-        self.logger.info("启动 FFmpeg 解码器...")
+        # FFmpeg 内完成 letterbox，额外输出一路模型尺寸的 gbrp 平面数据
+        self.letterbox = config['video'].get('ffmpeg_letterbox', False) and not self.infer_pipe
+        self.model_frame_size = in_w * in_h * 3
+        self.model_shape = [3, in_h, in_w]
+        self.prep_saved_ms = 0.0
+        self.downscaler = None
+        self.full_rgb = None
+        if self.pix_fmt != 'rgb24':
+            if config['model'].get('tiling', {}).get('enabled', False):
+                # 切片要在原分辨率上进行才能找到小目标，整帧转 RGB，不缩小
+                self.full_rgb = np.empty((self.h, self.w, 3), dtype=np.uint8)
+            elif not self.letterbox:
+                _, (new_w, new_h), _, _ = letterbox_params(self.h, self.w, (in_h, in_w))
+                self.downscaler = YuvDownscaler(self.h, self.w, (new_w, new_h), self.pix_fmt)
+
+        # 预分配帧环形缓冲，读线程直接 readinto，处理线程原地绘制
+        shapes = [self.frame_shape]
+        if self.letterbox:
+            shapes.append(self.model_shape)
+        self.ring = FrameRing(shapes, slots=config['video'].get('ring_slots', 4))
+
+        # 每 N 帧推理一次，中间帧由跟踪器外推检测框
+        self.infer_stride = max(1, int(self.options.get('infer_stride') or config.get('inference', {}).get('stride', 2)))
+        # 解码器只输出要推理的帧时 (rate/keyframe)，缩放、转换、管道拷贝都随推理帧率而不是源帧率增长
+        self.decode_mode = self.options.get('decode_mode') or config['video'].get('decode_mode', 'auto')
+        if self.decode_mode == 'auto':
+            self.decode_mode = 'rate' if self.infer_pipe else 'all'
+        if self.decode_mode not in DECODE_MODES:
+            raise ValueError(f"不支持的 decode_mode: {self.decode_mode}，可选 {DECODE_MODES}")
+        if self.mode == 'layer' and self.decode_mode == 'keyframe':
+            # 同一个解码器还要输出推流画面，不能跳过非关键帧
+            raise ValueError("layer 模式不支持 decode_mode=keyframe")
+        # rate 模式按帧序号每 infer_stride 帧取一帧 (保留源 pts，不补帧)，解码帧率 = 源帧率 / infer_stride，
+        # 源帧率在启动解码器前探测，探测失败按 video.fps 估算
+        self.decode_fps = None
+        if self.decode_mode == 'rate':
+            self.decode_fps = float(config['video'].get('fps', 25)) / self.infer_stride
+        self.published = 0
+        self.last_detections = None
+        # 检测图层: 处理线程每次推理后整张重画并替换引用，写线程按 layer_fps 持续写给 FFmpeg
+        self.layer_ratio = config['video'].get('layer_scale', 0.5)
+        self.layer_shape = (max(2, int(self.h * self.layer_ratio)) // 2 * 2,
+                            max(2, int(self.w * self.layer_ratio)) // 2 * 2, 4)
+        self.layer_ratio = self.layer_shape[1] / self.w
+        self.layer_fps = float(config['video'].get('layer_fps', 10))
+        self.layer = np.zeros(self.layer_shape, dtype=np.uint8) if self.mode == 'layer' else None
+        self.layer_dirty = False
+        self.layer_fd = None
+        self.layer_lock = threading.Lock()
+        # 图层时间戳 = 序号 / layer_fps，与推流画面同一时间轴；推理分支最新一帧的源 pts 由读线程更新
+        self.layer_seq = 0
+        self.layer_pts = None
+        self.tracker = Tracker(config) if config.get('tracker', {}).get('enabled', False) else None
+        # 检测结果缓存为叠加层，变化时才重画，其余帧只回写像素；跟踪器每帧外推的框都在变，不启用
+        self.overlay_cache = config.get('draw_config', {}).get('overlay_cache', False)
+        if self.overlay_cache and self.tracker is not None:
+            logger.warning("已启用跟踪器，overlay_cache 不生效")
+            self.overlay_cache = False
+        # 静止画面跳过推理，沿用上次检测结果
+        gate_enabled = self.options.get('motion_gate', config.get('motion_gate', {}).get('enabled', False))
+        self.motion_gate = MotionGate(config) if gate_enabled else None
+        self.gate_skip_total = 0
+        # 按处理耗时自动调节推理间隔与输出帧率
+        # 解码器已抽帧时逐帧推理，输出帧率目标不超过解码帧率
+        self.controller = StrideController(config, self.infer_stride if self.decode_mode == 'all' else 1)
+        if self.decode_fps is not None:
+            self.controller.target_fps = self.controller.fps = min(self.controller.target_fps, self.decode_fps)
+        self.rate_probed = False
+
+        # 断流重连: 只重启解码器，推流进程不断开，断流期间推送最近一帧压暗 + 提示文字
+        self.reconnect = config.get('reconnect', {})
+        self.process_in = None
+        self.signal_lost = False
+        self.last_frame_time = time.monotonic()
+        self.reconnects = 0
+        self.reconnect_attempts = 0
+        self.outage_since = None
+        self.outage_total = 0.0
+        self.hold_frame = np.zeros(self.frame_shape, dtype=np.uint8)
+        self.filler = np.zeros(self.frame_shape, dtype=np.uint8)
+
+        # 按源时间戳节拍推流: 解码器旁路输出逐帧 pts，帧处理完立即写出，
+        # 编码器以写入时刻作为时间戳并透传，输出节奏跟随源，不再按固定帧率 sleep
+        # 旁路模式发布的检测结果靠源 pts 与原始流逐帧对齐，图层模式按源 pts 决定写图层的时机，始终开启
+        self.source_timestamps = config['video'].get('source_timestamps', False) or self.infer_pipe
+        # 送入编码器的帧不是源的每一帧 (rate/keyframe 抽帧解码) 或按源节拍写出时，编码器以写入时刻作为时间戳；
+        # 否则编码器按固定帧率打时间戳，降低输出帧率只会让时间轴漂移，自适应调节只改推理间隔
+        self.wallclock_output = self.source_timestamps or self.decode_mode != 'all'
+        self.controller.adjust_fps = self.wallclock_output
+        self.clock = SourceClock()
+
+    def _decoder_input(self, in_args):
+        if self.decode_mode == 'keyframe':
+            # 解码器直接跳过非关键帧 (硬件解码器可能忽略该选项，此时退化为逐帧输出)
+            in_args = dict(in_args, skip_frame='nokey')
+        return self._infer_branch(ffmpeg.input(self.input_url, **in_args).video)
 
-        process_in = (
-            ffmpeg
-            .input(self.input_url, **in_args)
-            .output('pipe:', format='rawvideo', pix_fmt='rgb24')
-            .run_async(pipe_stdout=True, cmd=self.cfg['paths']['ffmpeg_bin'])
+    def _infer_branch(self, src):
+        """送入管道的帧: 按解码模式抽帧、缩放到推理尺寸，并旁路输出源时间戳"""
+        if self.decode_fps is not None:
+            # fps 滤镜会按输出帧率重打时间戳并在 VFR 源上补帧，select 只丢帧，保留源 pts
+            src = src.filter('select', f'not(mod(n,{self.infer_stride}))')
+        if self.decode_size is not None and self.decode_size != (self.w, self.h):
+            src = src.filter('scale', self.decode_size[0], self.decode_size[1], flags='bilinear')
+        if self.source_timestamps:
+            # 只需要 pts，关闭逐帧校验和 (720p 每帧约 2ms 解码器 CPU)
+            src = src.filter('showinfo', checksum=0)
+        return src
+
+    def _decoder_args(self, stream):
+        args = ['-hide_banner', '-nostats']
+        if self.source_timestamps:
+            # showinfo 的逐帧信息在 info 级别，带级别前缀便于只转发错误日志
+            args += ['-loglevel', '+level+info']
+        return stream.global_args(*args).compile(cmd=self.cfg['paths']['ffmpeg_bin'])
+
+    def _spawn_letterbox_decoder(self, in_args):
+        new_w, new_h, in_w, in_h, left, top = get_letterbox_size(self.cfg)
+        r_fd, w_fd = os.pipe()
+        enlarge_pipe(r_fd, self.model_frame_size, self.logger)
+
+        # 两路输出都关闭帧率同步 (不补帧/丢帧)，保证逐帧一一对应
+        src = self._decoder_input(in_args).filter_multi_output('split')
+        full = src[0].output('pipe:1', format='rawvideo', pix_fmt=self.pix_fmt, vsync='passthrough')
+        model = (
+            src[1]
+            .filter('scale', new_w, new_h, flags='bilinear')
+            .filter('pad', in_w, in_h, left, top, color='0x727272')
+            .output(f'pipe:{w_fd}', format='rawvideo', pix_fmt='gbrp', vsync='passthrough')
+        )
+        args = self._decoder_args(ffmpeg.merge_outputs(full, model))
+        try:
+            process_in = subprocess.Popen(args, stdout=subprocess.PIPE, pass_fds=(w_fd,),
+                                          stderr=subprocess.PIPE if self.source_timestamps else None)
+        finally:
+            os.close(w_fd)
+        enlarge_pipe(process_in.stdout, self.frame_size, self.logger)
+        return process_in, os.fdopen(r_fd, 'rb')
+
+    def _spawn_layer_pipeline(self, in_args):
+        """
+        图层模式: 一个 FFmpeg 进程完成解码、叠加检测图层、编码推流
+        split 一路抽帧缩小后经 stdout 送推理，另一路与额外管道传入的 RGBA 图层叠加后编码
+        推流画面保留源时间戳 (帧率信息不丢，编码器码控正常)；FFmpeg 把每个输入的起始时间归零，
+        图层按序号 / layer_fps 计时，与推流画面在同一时间轴上，写入时机见 _layer_writer
+        """
+        _, out_args = get_ffmpeg_args(self.cfg, self.gpu_id, output_url=self.output_url)
+        # 日志级别由 _decoder_args 统一设置，showinfo 需要 info 级别
+        out_args = {k: v for k, v in out_args.items() if k != 'loglevel'}
+        out_args['vsync'] = 'passthrough'
+        lh, lw, _ = self.layer_shape
+        # 图层管道保持默认大小 (小于一帧)，积压的旧图层不超过一帧
+        r_fd, w_fd = os.pipe()
+
+        src = ffmpeg.input(self.input_url, **in_args).video.filter_multi_output('split')
+        infer = self._infer_branch(src[0]).output('pipe:1', format='rawvideo', pix_fmt='rgb24', vsync='passthrough')
+        # 图层参数已知，不做探测 (默认按 analyzeduration 预读数秒的图层，启动明显变慢)
+        layer = (
+            ffmpeg.input(f'pipe:{r_fd}', format='rawvideo', pix_fmt='rgba', s=f'{lw}x{lh}', framerate=self.layer_fps,
+                         probesize=32, analyzeduration=0, thread_queue_size=1)
+            .filter('scale', self.w, self.h, flags='bilinear')
         )
+        out = ffmpeg.overlay(src[1], layer, eof_action='repeat').output(self.output_url, **out_args)
+        args = self._decoder_args(ffmpeg.merge_outputs(infer, out))
+        try:
+            process_in = subprocess.Popen(args, stdout=subprocess.PIPE, pass_fds=(r_fd,),
+                                          stderr=subprocess.PIPE if self.source_timestamps else None)
+        except Exception:
+            os.close(w_fd)
+            raise
+        finally:
+            os.close(r_fd)
+        enlarge_pipe(process_in.stdout, self.frame_size, self.logger)
+        with self.layer_lock:
+            self.layer_fd = w_fd
+            self.layer_seq = 0
+            self.layer_pts = None
+        return process_in, None
+
+    def _close_layer_pipe(self):
+        # 写线程持锁写入，FFmpeg 退出后写入立即失败返回，此时关闭不会与写入交错
+        with self.layer_lock:
+            if self.layer_fd is not None:
+                os.close(self.layer_fd)
+                self.layer_fd = None
+
+    def _layer_writer(self):
+        """
+        把当前检测图层写给 FFmpeg。叠加滤镜对每帧画面都要等到时间戳不早于它的图层才输出，
+        等待期间 FFmpeg 优先推进落后的推流输出，推理分支随之停顿，因此图层要始终略领先于画面:
+        第 N 帧图层 (时间戳 N / layer_fps) 在推理分支最新源 pts + lead 追上它时写入，不提前堆积旧图层；
+        启动或推理分支停顿时 (源 pts 不再前进) 按 layer_fps 墙钟节拍补写，两路不会互相等待
+        """
+        interval = 1.0 / self.layer_fps
+        # 推流画面领先推理分支的部分 (管道、环形缓冲中的帧) 由 lead 覆盖
+        lead = 3 * interval
+        last_pts, last_change, last_write = None, time.monotonic(), 0.0
+        # 停止后继续写到解码器退出: 叠加滤镜缺图层会卡住整个滤镜图，读线程将一直阻塞在读帧上
+        while self.running or self.layer_fd is not None:
+            pts, now = self.layer_pts, time.monotonic()
+            if pts != last_pts:
+                last_pts, last_change = pts, now
+            with self.layer_lock:
+                due = self.layer_fd is not None and (
+                    (pts is not None and self.layer_seq * interval <= pts + lead) or
+                    ((pts is not None or self.layer_seq == 0) and now - max(last_change, last_write) >= interval))
+                if due:
+                    view = memoryview(self.layer).cast('B')
+                    try:
+                        while view:
+                            view = view[os.write(self.layer_fd, view):]
+                        self.layer_seq += 1
+                    except OSError:
+                        # 解码器已退出 (断流/重启中)
+                        pass
+                    last_write = time.monotonic()
+            if not due:
+                time.sleep(0.005)
+
+    def _spawn_decoder(self, in_args):
+        if self.mode == 'layer':
+            return self._spawn_layer_pipeline(in_args)
+        if self.letterbox:
+            return self._spawn_letterbox_decoder(in_args)
+        out = self._decoder_input(in_args).output('pipe:', format='rawvideo', pix_fmt=self.pix_fmt, vsync='passthrough')
+        process_in = subprocess.Popen(self._decoder_args(out), stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE if self.source_timestamps else None)
+        enlarge_pipe(process_in.stdout, self.frame_size, self.logger)
+        return process_in, None
+
+    def _decode(self, in_args):
+        """启动一次解码器并持续读帧，直到断流或停止，返回读到的帧数"""
+        self.logger.info("启动 FFmpeg 解码器...")
+        process_in, model_pipe = self._spawn_decoder(in_args)
+        self.process_in = process_in
+        self.metrics.decoder_starts += 1
+        pts_reader = PtsReader(process_in.stderr, self.logger) if self.source_timestamps else None
+        self.clock.reset()
+        frames = 0
         try:
             while self.running:
                 self.last_heartbeat = time.time()
-                raw_frame = process_in.stdout.read(self.frame_size)
-                if not raw_frame: 
+                slot = self.ring.acquire_write()
+                if slot is None:
+                    # 处理线程占用了全部槽位，稍后再试
+                    time.sleep(0.005)
+                    continue
+                idx, buffers = slot
+                if not read_into(process_in.stdout, buffers[0]):
+                    self.ring.abort_write(idx)
+                    self.logger.info("拉流结束")
+                    break
+                # 两路输出逐帧对应，按顺序读取
+                if model_pipe is not None and not read_into(model_pipe, buffers[1]):
+                    self.ring.abort_write(idx)
+                    self.logger.info("模型输入流结束")
+                    break
+                pts = pts_reader.pop() if pts_reader is not None else None
+                if self.mode == 'layer' and pts is not None:
+                    self.layer_pts = pts
+                arrival, lag_ms = self.clock.arrive(pts)
+                self.ring.publish(idx, (pts, arrival, lag_ms))
+                self.last_frame_time = arrival
+                if frames == 0 and self.signal_lost:
+                    self._mark_recovered()
+                frames += 1
+        finally:
+            self.logger.info("正在关闭 FFmpeg 解码器...")
+            self.process_in = None
+            if pts_reader is not None:
+                pts_reader.quiet = True
+            process_in.stdout.close()
+            if model_pipe is not None:
+                model_pipe.close()
+            process_in.terminate()
+            try:
+                process_in.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                # 图层模式下滤镜图可能卡在等待图层，收不到退出信号
+                process_in.kill()
+                process_in.wait()
+            self._close_layer_pipe()
+            if pts_reader is not None:
+                pts_reader.thread.join(timeout=1)
+                process_in.stderr.close()
+        return frames
+
+    def _probe_decode_fps(self, in_args):
+        """rate 模式按探测到的源帧率计算解码帧率，只探测一次"""
+        if self.decode_fps is None or self.rate_probed:
+            return
+        self.rate_probed = True
+        fps = probe_fps(self.cfg['paths']['ffmpeg_bin'], self.input_url, in_args.get('rtsp_transport'))
+        if fps is None:
+            self.logger.warning(f"探测源帧率失败，按 video.fps 估算解码帧率: {self.input_url}")
+            return
+        self.decode_fps = fps / self.infer_stride
+        # 输出帧率目标不超过解码帧率
+        target = self.cfg.get('adaptive', {}).get('target_fps') or fps
+        self.controller.target_fps = self.controller.fps = min(float(target), self.decode_fps)
+
+    def _reader(self):
+        in_args, _ = get_ffmpeg_args(self.cfg, self.gpu_id, input_url=self.input_url)
+        attempt = 0
+        try:
+            self._probe_decode_fps(in_args)
+            while self.running:
+                frames = self._decode(in_args)
+                if not self.running:
+                    break
+                if not self.reconnect.get('enabled', False):
                     self.logger.info("拉流结束退出")
                     break
-                if self.frame_queue.full():
-                    self.frame_queue.get() # 丢弃老帧
-                self.frame_queue.put(raw_frame)
+
+                self._mark_lost()
+                # 本次连上过就从头退避，连不上则指数增长
+                attempt = 1 if frames else attempt + 1
+                max_attempts = self.reconnect.get('max_attempts', 0)
+                if max_attempts and attempt > max_attempts:
+                    self.logger.error(f"连续 {max_attempts} 次重连失败，退出")
+                    break
+                delay = self._backoff(attempt)
+                self.logger.warning(f"拉流中断，{delay:.1f}s 后第 {attempt} 次重连: {self.input_url}")
+                deadline = time.monotonic() + delay
+                while self.running and time.monotonic() < deadline:
+                    self.last_heartbeat = time.time()
+                    time.sleep(0.1)
+                self.reconnect_attempts += 1
         finally:
-            self.logger.info("正在关闭 FFmpeg 资源...")
             self.running = False
-            process_in.stdout.close() 
+            self.ring.close()
+
+    def _backoff(self, attempt):
+        """带随机抖动的指数退避，避免多路流在同一时刻集中重连"""
+        delay = min(
+            self.reconnect.get('max_delay_s', 30.0),
+            self.reconnect.get('initial_delay_s', 0.5) * self.reconnect.get('multiplier', 2.0) ** (attempt - 1),
+        )
+        jitter = self.reconnect.get('jitter', 0.3)
+        return delay * random.uniform(1 - jitter, 1 + jitter)
+
+    def _mark_lost(self):
+        if not self.signal_lost:
+            self.signal_lost = True
+            self.outage_since = time.monotonic()
+
+    def _mark_recovered(self):
+        outage = time.monotonic() - self.outage_since
+        self.outage_total += outage
+        self.outage_since = None
+        self.reconnects += 1
+        self.metrics.reconnects += 1
+        self.signal_lost = False
+        self.logger.info(f"重连成功，中断 {outage:.1f}s: {self.input_url}")
+
+    def _check_stall(self):
+        """解码器未退出但长时间没有新帧 (网络挂起等)，结束解码器触发重连"""
+        process_in = self.process_in
+        stall_timeout = self.reconnect.get('stall_timeout_s', 10.0)
+        if self.signal_lost or process_in is None or time.monotonic() - self.last_frame_time < stall_timeout:
+            return
+        self.logger.warning(f"{stall_timeout}s 未收到新帧，重启解码器")
+        self.last_frame_time = time.monotonic()
+        try:
             process_in.terminate()
-            process_in.wait() 
+        except OSError:
+            pass
+
+    def _render_filler(self):
+        """断流期间推送的画面: 最近一帧压暗 (没有则黑屏)，叠加提示文字"""
+        last = self.reconnect.get('filler', 'last') == 'last'
+        canvas, white = self.filler, (255, 255, 255)
+        if self.pix_fmt == 'rgb24':
+            if last:
+                np.floor_divide(self.hold_frame, 3, out=self.filler)
+            else:
+                self.filler.fill(0)
+        else:
+            # YUV 只压暗亮度，色度置中性灰，文字只写亮度平面
+            canvas, white = self.filler[:self.h], 235
+            if last:
+                np.floor_divide(self.hold_frame[:self.h], 3, out=canvas)
+            else:
+                canvas.fill(16)
+            self.filler[self.h:] = 128
+        text = "NO SIGNAL - RECONNECTING"
+        font_scale = self.h / 720 * 1.2
+        (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 2)
+        cv2.putText(canvas, text, ((self.w - tw) // 2, (self.h + th) // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, white, 2, cv2.LINE_AA)
+
+    def metric_gauges(self):
+        """导出到 /metrics 的瞬时值"""
+        stats = self._link_stats()
+        return {
+            'fps': self.fps,
+            'infer_stride': self.controller.stride,
+            'fps_target': self.controller.fps,
+            'budget_headroom': self.controller.headroom,
+            'queue_depth': self.ring.pending(),
+            'ring_in_use': self.ring.in_use(),
+            'signal_lost': int(stats['signal_lost']),
+            'outage_seconds': stats['outage_s'],
+        }
+
+    def swap_detector(self, detector):
+        """
+        迁移到其他设备推理: 只替换推理后端，解码、推流进程不重启，编解码仍在原设备上
+        处理线程每帧读取 self.detector，正在进行的一次推理在原设备上完成
+        """
+        self.detector = detector
+
+    def memory_bytes(self):
+        """帧缓冲占用的内存: 环形缓冲、占位画面、叠加层缓存 (3 帧)、检测图层"""
+        total = sum(buf.nbytes for buffers in self.ring.buffers for buf in buffers)
+        total += self.hold_frame.nbytes + self.filler.nbytes
+        if self.overlay_cache:
+            total += self.hold_frame.nbytes * 3
+        if self.layer is not None:
+            total += self.layer.nbytes
+        return total
+
+    def _link_stats(self):
+        outage = self.outage_total
+        if self.outage_since is not None:
+            outage += time.monotonic() - self.outage_since
+        return {
+            'signal_lost': self.signal_lost,
+            'reconnects': self.reconnects,
+            'reconnect_attempts': self.reconnect_attempts,
+            'outage_s': round(outage, 1),
+        }
 
     def _processor(self):
-        _, out_args = get_ffmpeg_args(self.cfg, self.gpu_id)
+        _, out_args = get_ffmpeg_args(self.cfg, self.gpu_id, output_url=self.output_url)
+        # rawvideo 输入不带时间戳，不指定帧率时 FFmpeg 按 25fps 计时
+        enc_in = {'framerate': self.controller.target_fps}
+        if self.wallclock_output:
+            # 以写入时刻作为帧时间戳并透传，不按固定帧率补帧/丢帧
+            enc_in = {'use_wallclock_as_timestamps': 1}
+            out_args = dict(out_args, vsync='passthrough')
         device_type = self.cfg.get('device_type', 'cpu').lower()
         process_out=None
+        process_fixer = None
         if(device_type!="ascend"):
             process_out = (
                 ffmpeg
-                .input('pipe:', format='rawvideo', pix_fmt='rgb24', s=f"{self.w}x{self.h}")
+                .input('pipe:', format='rawvideo', pix_fmt=self.pix_fmt, s=f"{self.w}x{self.h}", **enc_in)
                 .output(self.output_url, **out_args)
                 .run_async(pipe_stdin=True, cmd=self.cfg['paths']['ffmpeg_bin'])
             )
         else:
-            process_fixer = (
-                ffmpeg
-                .input('pipe:', format='h264') # 接收上一个 ffmpeg 的输出
-                .output(self.output_url, vcodec='copy', format='flv', flvflags='no_duration_filesize',loglevel='error')
-                .run_async(pipe_stdin=True, cmd=self.cfg['paths']['ffmpeg_bin'])
-            )
             process_out = (
                 ffmpeg
-                .input('pipe:', format='rawvideo', pix_fmt='rgb24', s=f"{self.w}x{self.h}")
-                .output('pipe:', **out_args) # 输出到 pipe，由 Python 中转给 process_fixer
+                .input('pipe:', format='rawvideo', pix_fmt=self.pix_fmt, s=f"{self.w}x{self.h}", **enc_in)
+                .output('pipe:', **out_args) # 输出裸流到 pipe，交给 process_fixer 封装推流
                 .run_async(pipe_stdin=True, pipe_stdout=True, cmd=self.cfg['paths']['ffmpeg_bin'])
             )
-
-            def bridge_pipe(p_from, p_to):
-                try:
-                    while self.running:
-                        data = p_from.stdout.read(4096) # 搬运块大小
-                        if not data: break
-                        p_to.stdin.write(data)
-                except:
-                    pass
-                    
-            bridge_thread = threading.Thread(target=bridge_pipe, args=(process_out, process_fixer), daemon=True)
-            bridge_thread.start()
+            # 编码器 stdout 直接作为 process_fixer 的 stdin，两个 FFmpeg 之间不再经过 Python 中转
+            enlarge_pipe(process_out.stdout, logger=self.logger)
+            fixer_args = (
+                ffmpeg
+                .input('pipe:', format='h264') # 接收上一个 ffmpeg 的输出
+                .output(self.output_url, vcodec='copy', format='flv', flvflags='no_duration_filesize',loglevel='error')
+                .compile(cmd=self.cfg['paths']['ffmpeg_bin'])
+            )
+            process_fixer = subprocess.Popen(fixer_args, stdin=process_out.stdout)
+            process_out.stdout.close()
+        enlarge_pipe(process_out.stdin, self.frame_size, self.logger)
         
 
 
         frame_idx = 0
         metrics = {
             't_queue': 0.0, 't_infer': 0.0, 't_draw': 0.0, 
-            't_write': 0.0, 't_total': 0.0, 'drop_count': 0
+            't_write': 0.0, 't_total': 0.0, 'drop_count': 0,
+            't_sleep': 0.0, 'n_infer': 0,
+            'latency': 0.0, 'latency_max': 0.0, 'source_lag': 0.0,
         }
-        
-        fps_target = 25
-        frame_duration = 1.0 / fps_target
+        calib_samples = []
         
         window_start_time = time.perf_counter()
         last_push_time = time.perf_counter()
         
         detections, scale, pad_w, pad_h = [], 1.0, 0, 0
+        overlay = OverlayCache(self.drawer, self.frame_shape) if self.overlay_cache else None
+        filler_ready = False
+        last_out_ts = None
 
         while self.running:
             try:
                 t_start = time.perf_counter() 
 
-                # 队列排空 
+                # 取最新一帧，未取走的旧帧已在缓冲内被覆盖
                 t0 = time.perf_counter()
-                raw_bytes = None
-                current_drop = 0
-                # 取最后一帧
-                while not self.frame_queue.empty():
-                    raw_bytes = self.frame_queue.get_nowait()
-                    current_drop += 1
-                
-                if raw_bytes is None:
-                    try:
-                        raw_bytes = self.frame_queue.get(timeout=2)
-                    except queue.Empty:
+                slot = self.ring.acquire_latest(timeout=1.0 / self.controller.fps)
+                if slot is None:
+                    if not self.signal_lost:
+                        self._check_stall()
+                        continue
+                    # 断流期间按输出帧率推送占位画面，推流不断开
+                    if not filler_ready:
+                        self._render_filler()
+                        filler_ready = True
+                        # 重连后画面可能已变化，旧的检测和轨迹作废
+                        detections = []
+                        if self.tracker is not None:
+                            self.tracker = Tracker(self.cfg)
+                        if self.motion_gate is not None:
+                            self.motion_gate.reference = None
+                    sleep_time = 1.0 / self.controller.fps - (time.perf_counter() - last_push_time)
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
+                    process_out.stdin.write(self.filler)
+                    last_push_time = time.perf_counter()
+                    self.stats.update(self._link_stats())
+                    continue
+                idx, buffers, meta, current_drop = slot
+                pts, arrival, lag_ms = meta
+                filler_ready = False
+
+                # 过载降帧时按源时间戳抽帧，代替 sleep 限速
+                if self.source_timestamps and self.controller.fps < self.controller.target_fps:
+                    ts = pts if pts is not None else arrival
+                    if last_out_ts is not None and 0 <= ts - last_out_ts < 0.9 / self.controller.fps:
+                        self.ring.release(idx)
                         continue
+                    last_out_ts = ts
                 
                 t_queue_val = (time.perf_counter() - t0) * 1000 
 
-                frame = np.frombuffer(raw_bytes, np.uint8).reshape([self.h, self.w, 3]).copy()
+                try:
+                    frame = buffers[0]
+                    model_input = buffers[1] if self.letterbox else None
+                    # 定期保存一帧原始画面，断流时作为占位画面的底图
+                    if frame_idx % 25 == 0 and self.reconnect.get('enabled', False):
+                        np.copyto(self.hold_frame, frame)
 
-                # 推理
-                t1 = time.perf_counter()
-                t_infer_val = 0.0
-                if frame_idx % 2 == 0:
-                    detections, scale, pad_w, pad_h = self.detector.infer(frame)
-                    t_infer_val = (time.perf_counter() - t1) * 1000
+                    # 推理
+                    t_infer_val = 0.0
+                    gate_input = frame if self.pix_fmt == 'rgb24' else frame[:self.h]
+                    if frame_idx % self.controller.stride == 0 and (
+                            self.motion_gate is None or self.motion_gate.should_infer(gate_input)):
+                        if model_input is not None and len(calib_samples) < 10:
+                            calib_samples.append(self._measure_prep_saved(frame, model_input))
+                            self.prep_saved_ms = sum(calib_samples) / len(calib_samples)
+                        t1 = time.perf_counter()
+                        detections, scale, pad_w, pad_h = self._infer_frame(frame, model_input)
+                        if self.tracker is not None:
+                            detections = self.tracker.update(detections)
+                        t_infer_val = (time.perf_counter() - t1) * 1000
+                        metrics['n_infer'] += 1
+                    elif self.tracker is not None:
+                        detections = self.tracker.predict()
                 
-                # 绘图 
-                t2 = time.perf_counter()
-                frame = self.drawer.draw_detections(frame, detections, scale, pad_w, pad_h)
-                t_draw_val = (time.perf_counter() - t2) * 1000
-
-                elapsed = time.perf_counter() - last_push_time
-                sleep_time = frame_duration - elapsed
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                    # 绘图 
+                    t2 = time.perf_counter()
+                    if overlay is not None:
+                        overlay.update(detections, scale, pad_w, pad_h)
+                        frame = overlay.composite(frame)
+                    else:
+                        frame = self.drawer.draw_detections(frame, detections, scale, pad_w, pad_h)
+                    t_draw_val = (time.perf_counter() - t2) * 1000
+
+                    if not self.source_timestamps:
+                        frame_duration = 1.0 / self.controller.fps
+                        elapsed = time.perf_counter() - last_push_time
+                        sleep_time = frame_duration - elapsed
+                        if sleep_time > 0:
+                            time.sleep(sleep_time)
+                            metrics['t_sleep'] += sleep_time * 1000
                 
-                # 推流
-                t3 = time.perf_counter()
-                process_out.stdin.write(frame.tobytes())
-                last_push_time = time.perf_counter() 
-                t_write_val = (time.perf_counter() - t3) * 1000
+                    # 推流
+                    t3 = time.perf_counter()
+                    process_out.stdin.write(frame)  # 直接写出缓冲，不再 tobytes 复制
+                    last_push_time = time.perf_counter() 
+                    t_write_val = (time.perf_counter() - t3) * 1000
+                    latency_val = (time.monotonic() - arrival) * 1000
+                finally:
+                    self.ring.release(idx)
 
                 # 统计总耗时
                 t_total_val = (time.perf_counter() - t_start) * 1000
@@ -165,6 +698,21 @@ class AiStreamer:
                 metrics['t_write'] += t_write_val
                 metrics['t_total'] += t_total_val
                 metrics['drop_count'] += current_drop
+                metrics['latency'] += latency_val
+                metrics['latency_max'] = max(metrics['latency_max'], latency_val)
+                metrics['source_lag'] += lag_ms
+
+                m = self.metrics
+                m.observe('queue', t_queue_val)
+                if t_infer_val:
+                    m.observe('infer', t_infer_val)
+                    m.infers += 1
+                m.observe('draw', t_draw_val)
+                m.observe('write', t_write_val)
+                m.observe('total', t_total_val)
+                m.observe('latency', latency_val)
+                m.frames += 1
+                m.drops += current_drop
 
                 # 每 25 帧打印一次平均表现
                 if (frame_idx + 1) % 25 == 0:
@@ -173,8 +721,41 @@ class AiStreamer:
                     real_fps = 25.0 / actual_window_duration
                     
                     avg = {k: v / 25.0 for k, v in metrics.items()}
+                    infer_ms = metrics['t_infer'] / max(1, metrics['n_infer'])
+                    other_ms = avg['t_total'] - avg['t_infer'] - avg['t_sleep'] - avg['t_queue']
+                    self.controller.update(infer_ms, other_ms, avg['drop_count'])
                     
                     self.fps=real_fps
+                    gate_skip_ratio = 0.0
+                    if self.motion_gate is not None:
+                        self.gate_skip_total += self.motion_gate.skipped
+                        gate_skip_ratio = self.motion_gate.pop_skip_ratio()
+                    self.stats = {
+                        'fps': round(real_fps, 2),
+                        't_queue_ms': round(avg['t_queue'], 2),
+                        't_infer_ms': round(infer_ms, 2),
+                        'infer_stride': self.controller.stride,
+                        'fps_target': round(self.controller.fps, 2),
+                        'decode_mode': self.decode_mode,
+                        'drop_rate': round(self.controller.drop_rate, 3),
+                        'budget_headroom': round(self.controller.headroom, 3),
+                        't_draw_ms': round(avg['t_draw'], 2),
+                        'overlay_renders': overlay.renders if overlay is not None else None,
+                        't_write_ms': round(avg['t_write'], 2),
+                        't_total_ms': round(avg['t_total'], 2),
+                        'drop_per_loop': round(avg['drop_count'], 2),
+                        'prep_saved_ms': round(self.prep_saved_ms, 2),
+                        'gate_skip_ratio': round(gate_skip_ratio, 3),
+                        'gate_skip_total': self.gate_skip_total,
+                        # 帧从解码器输出到写入编码器的机内时延 (不含相机编码、网络和播放端缓冲)
+                        'latency_ms': round(avg['latency'], 2),
+                        'latency_max_ms': round(metrics['latency_max'], 2),
+                        # 相对本次连接中最早到达的帧，按源时间戳估算的额外滞后 (解码/网络积压)
+                        'source_lag_ms': round(avg['source_lag'], 2),
+                        'src_fps': round(self.clock.fps, 2),
+                        'quantiles_ms': self.metrics.quantiles(),
+                        **self._link_stats(),
+                    }
                     # self.logger.info(
                     #     f"GPU[{self.gpu_id}] | "
                     #     f"RealFPS: {real_fps:4.1f} | "
@@ -200,12 +781,183 @@ class AiStreamer:
         # 退出后清理
         process_out.stdin.close()
         process_out.wait()
+        if process_fixer is not None:
+            # 编码器退出后 process_fixer 读到 EOF 自行结束
+            try:
+                process_fixer.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process_fixer.terminate()
+                process_fixer.wait()
+
+    def _detection_processor(self, handle):
+        """
+        旁路/图层模式: 解码器送来的每一帧都推理，不绘制原始帧也不写编码器
+        handle(pts, arrival, detections, scale, pad_w, pad_h) 处理检测结果，scale 已折算到原图
+        """
+        if self.sidecar and self.publisher is None:
+            self.logger.warning(f"旁路模式未配置 MQTT 发布，检测结果只保留在任务状态中: {self.input_url}")
+        ratio = self.decode_size[0] / self.w
+        metrics = {'t_queue': 0.0, 't_infer': 0.0, 't_total': 0.0, 'drop_count': 0, 'latency': 0.0, 'n_infer': 0}
+        window_start_time = time.perf_counter()
+        frame_idx = 0
+        decoded = 0
+
+        while self.running:
+            try:
+                t_start = time.perf_counter()
+                slot = self.ring.acquire_latest(timeout=1.0)
+                if slot is None:
+                    if not self.signal_lost:
+                        self._check_stall()
+                    continue
+                idx, buffers, meta, current_drop = slot
+                pts, arrival, lag_ms = meta
+                decoded += 1
+                if self.decode_mode == 'all' and (decoded - 1) % self.infer_stride:
+                    # 逐帧解码时按推理间隔跳帧
+                    self.ring.release(idx)
+                    continue
+                t_queue_val = (time.perf_counter() - t_start) * 1000
+
+                detections = None
+                t_infer_val = 0.0
+                try:
+                    frame = buffers[0]
+                    if self.motion_gate is None or self.motion_gate.should_infer(frame):
+                        t1 = time.perf_counter()
+                        detections, scale, pad_w, pad_h = self.detector.infer(frame)
+                        if self.tracker is not None:
+                            detections = self.tracker.update(detections)
+                        t_infer_val = (time.perf_counter() - t1) * 1000
+                finally:
+                    self.ring.release(idx)
+
+                if detections is not None:
+                    handle(pts, arrival, detections, scale * ratio, pad_w, pad_h)
+                    metrics['n_infer'] += 1
+
+                t_total_val = (time.perf_counter() - t_start) * 1000
+                latency_val = (time.monotonic() - arrival) * 1000
+                metrics['t_queue'] += t_queue_val
+                metrics['t_infer'] += t_infer_val
+                metrics['t_total'] += t_total_val
+                metrics['drop_count'] += current_drop
+                metrics['latency'] += latency_val
+
+                m = self.metrics
+                m.observe('queue', t_queue_val)
+                if t_infer_val:
+                    m.observe('infer', t_infer_val)
+                    m.infers += 1
+                m.observe('total', t_total_val)
+                m.observe('latency', latency_val)
+                m.frames += 1
+                m.drops += current_drop
+
+                if (frame_idx + 1) % 25 == 0:
+                    now = time.perf_counter()
+                    self.fps = 25.0 / (now - window_start_time)
+                    avg = {k: v / 25.0 for k, v in metrics.items()}
+                    self.stats = {
+                        'mode': self.mode,
+                        'fps': round(self.fps, 2),
+                        't_queue_ms': round(avg['t_queue'], 2),
+                        't_infer_ms': round(metrics['t_infer'] / max(1, metrics['n_infer']), 2),
+                        't_total_ms': round(avg['t_total'], 2),
+                        'drop_per_loop': round(avg['drop_count'], 2),
+                        'latency_ms': round(avg['latency'], 2),
+                        'src_fps': round(self.clock.fps, 2),
+                        'decode_mode': self.decode_mode,
+                        'published': self.published,
+                        'quantiles_ms': self.metrics.quantiles(),
+                        **self._link_stats(),
+                    }
+                    for k in metrics: metrics[k] = 0.0
+                    window_start_time = now
+                frame_idx += 1
+
+            except Exception as e:
+                self.logger.error(f"{self.mode} 处理循环异常: {e}")
+                continue
+
+    def _infer_frame(self, frame, model_input):
+        """叠加模式的推理入口，按管道格式把帧转成检测器需要的输入"""
+        if self.pix_fmt == 'rgb24':
+            return self.detector.infer(frame, model_input)
+        if self.downscaler is not None:
+            # 只把缩小后的帧转成 RGB，比例折算进 scale，绘图时还原到原图
+            detections, scale, pad_w, pad_h = self.detector.infer(self.downscaler(frame))
+            return detections, scale * self.downscaler.ratio, pad_w, pad_h
+        if self.full_rgb is not None:
+            cv2.cvtColor(frame, TO_RGB[self.pix_fmt], dst=self.full_rgb)
+            return self.detector.infer(self.full_rgb)
+        # FFmpeg 已给出 letterbox 输入，传 Y 平面视图只为提供原图的宽高
+        return self.detector.infer(frame[:self.h], model_input)
+
+    def _publish(self, pts, arrival, detections, scale, pad_w, pad_h):
+        objects = []
+        for det in detections:
+            x1, y1, x2, y2, conf, cls_id = det[:6]
+            idx = int(cls_id)
+            obj = {
+                'box': [
+                    round(min(self.w, max(0.0, (x1 - pad_w) / scale)), 1),
+                    round(min(self.h, max(0.0, (y1 - pad_h) / scale)), 1),
+                    round(min(self.w, max(0.0, (x2 - pad_w) / scale)), 1),
+                    round(min(self.h, max(0.0, (y2 - pad_h) / scale)), 1),
+                ],
+                'conf': round(float(conf), 3),
+                'cls': idx,
+                'label': self.drawer.label_list[idx] if idx < len(self.drawer.label_list) else str(idx),
+            }
+            if len(det) > 6:
+                obj['track_id'] = int(det[6])
+            objects.append(obj)
+        payload = {
+            'stream': self.stream,
+            'input_url': self.input_url,
+            'pts': pts,  # 源流时间戳 (秒)，用于与原始流逐帧对齐
+            'timestamp': time.time() - (time.monotonic() - arrival),  # 帧到达本机的时刻
+            'width': self.w,
+            'height': self.h,
+            'detections': objects,
+        }
+        self.last_detections = payload
+        if self.publisher is not None and self.publisher.publish(self.stream, payload):
+            self.published += 1
+
+    def _render_layer(self, pts, arrival, detections, scale, pad_w, pad_h):
+        # 前后两次都没有目标时图层不变，不重画
+        if len(detections) == 0 and not self.layer_dirty:
+            return
+        self.layer_dirty = len(detections) > 0
+        # 画到新图层上再替换引用，写线程不会写出画了一半的图层
+        layer = np.zeros(self.layer_shape, dtype=np.uint8)
+        self.drawer.draw_layer(layer, detections, scale / self.layer_ratio, pad_w, pad_h, self.layer_ratio)
+        self.layer = layer
+
+    def _measure_prep_saved(self, frame, model_input):
+        """对比 Python 侧 letterbox 与 FFmpeg 预处理后仅做归一化的耗时，得到单帧节省的 CPU 时间"""
+        t0 = time.perf_counter()
+        if self.pix_fmt != 'rgb24':
+            # YUV 管道下 Python 侧需要先转 RGB
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420 if self.pix_fmt == 'yuv420p' else cv2.COLOR_YUV2RGB_NV12)
+        letterbox(frame, self.detector.input_size)
+        t1 = time.perf_counter()
+        planar_to_blob(model_input)
+        t2 = time.perf_counter()
+        return ((t1 - t0) - (t2 - t1)) * 1000
 
     def run(self):
-        threads = [
-            threading.Thread(target=self._reader, daemon=True),
-            threading.Thread(target=self._processor, daemon=True)
-        ]
+        if self.mode == 'sidecar':
+            processor = threading.Thread(target=self._detection_processor, args=(self._publish,), daemon=True)
+        elif self.mode == 'layer':
+            processor = threading.Thread(target=self._detection_processor, args=(self._render_layer,), daemon=True)
+        else:
+            processor = threading.Thread(target=self._processor, daemon=True)
+        threads = [threading.Thread(target=self._reader, daemon=True), processor]
+        if self.mode == 'layer':
+            threads.append(threading.Thread(target=self._layer_writer, daemon=True))
         for t in threads: t.start()
         for t in threads: t.join()
 
@@ -0,0 +1,65 @@
+class StrideController:
+    """
+    按实测处理耗时闭环调节推理间隔和输出帧率
+    每个统计窗口调用一次 update，根据单帧平均工作耗时与帧预算的差距:
+      超预算或持续丢帧 -> 先加大推理间隔，已到上限再降低输出帧率 (adjust_fps 为 False 时不降)
+      余量充足       -> 先恢复输出帧率，再缩小推理间隔
+    连续 patience 个窗口同向才调整，避免来回抖动
+    """
+
+    def __init__(self, config, stride):
+        cfg = config.get('adaptive', {})
+        self.enabled = cfg.get('enabled', False)
+        self.target_fps = float(cfg.get('target_fps') or config['video'].get('fps', 25))
+        self.max_latency_ms = float(cfg.get('max_latency_ms', 1000.0 / self.target_fps))
+        self.min_stride = int(cfg.get('min_stride', 1))
+        self.max_stride = int(cfg.get('max_stride', 5))
+        self.min_fps = float(cfg.get('min_fps', 10))
+        self.max_drop_rate = float(cfg.get('max_drop_rate', 0.2))
+        self.patience = int(cfg.get('patience', 2))
+
+        self.stride = stride
+        self.fps = self.target_fps
+        # 编码器按固定帧率打时间戳时由调用方关闭，输出帧率保持 target_fps
+        self.adjust_fps = True
+        self.headroom = 1.0
+        self.drop_rate = 0.0
+        self._pressure = 0  # >0 连续过载窗口数, <0 连续空闲窗口数
+
+    def budget_ms(self):
+        # 单帧可用时间: 帧间隔与延迟预算取较小值
+        return min(1000.0 / self.fps, self.max_latency_ms)
+
+    def update(self, infer_ms, other_ms, drop_rate):
+        """
+        infer_ms: 单次推理平均耗时
+        other_ms: 每帧除推理和等待外的平均耗时 (取帧/绘图/推流)
+        drop_rate: 丢帧数 / 处理帧数
+        """
+        work_ms = other_ms + infer_ms / self.stride
+        self.headroom = 1.0 - work_ms / self.budget_ms()
+        self.drop_rate = drop_rate
+        if not self.enabled:
+            return
+
+        if self.headroom < 0 or drop_rate > self.max_drop_rate:
+            self._pressure = max(self._pressure, 0) + 1
+        elif self.headroom > 0.3:
+            self._pressure = min(self._pressure, 0) - 1
+        else:
+            self._pressure = 0
+
+        if self._pressure >= self.patience:
+            self._pressure = 0
+            if self.stride < self.max_stride:
+                self.stride += 1
+            elif self.adjust_fps and self.fps > self.min_fps:
+                self.fps = max(self.min_fps, self.fps * 0.8)
+        elif self._pressure <= -self.patience:
+            self._pressure = 0
+            if self.fps < self.target_fps:
+                self.fps = min(self.target_fps, self.fps * 1.25)
+            elif self.stride > self.min_stride:
+                # 预估缩小间隔后仍留有余量才调整
+                if other_ms + infer_ms / (self.stride - 1) < self.budget_ms() * 0.8:
+                    self.stride -= 1
@@ -0,0 +1,88 @@
+import re
+import threading
+import time
+from collections import deque
+
+SHOWINFO_RE = re.compile(r'\] \[info\] n:\s*\d+\s+pts:\s*\S+\s+pts_time:(\S+)')
+
+
+class PtsReader:
+    """
+    解码器的时间戳旁路: 解码器加 showinfo 滤镜并以 +level+info 输出日志，
+    后台线程从 stderr 解析每帧的 pts_time，与 stdout 输出的帧按顺序一一对应
+    其余 error/fatal 日志转发给 logger
+    """
+
+    def __init__(self, stderr, logger, max_pending=256):
+        self.logger = logger
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.quiet = False  # 主动关闭解码器时不再转发 Broken pipe 等错误
+        self.thread = threading.Thread(target=self._run, args=(stderr,), daemon=True)
+        self.thread.start()
+
+    def _run(self, stderr):
+        try:
+            for raw in stderr:
+                line = raw.decode('utf-8', errors='replace').rstrip()
+                m = SHOWINFO_RE.search(line)
+                if m is None:
+                    if not self.quiet and ('[error]' in line or '[fatal]' in line):
+                        self.logger.error(f"FFmpeg 解码器: {line}")
+                    continue
+                try:
+                    pts = float(m.group(1))
+                except ValueError:
+                    pts = None  # NOPTS 也占一个位置，保证与帧对应
+                with self.cond:
+                    if len(self.pending) >= self.max_pending:
+                        # 帧一直没被读走，对应关系已不可靠，丢弃重来
+                        self.pending.clear()
+                    self.pending.append(pts)
+                    self.cond.notify()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.cond:
+                self.closed = True
+                self.cond.notify_all()
+
+    def pop(self, timeout=0.05):
+        """取下一帧的 pts (秒)，日志晚于帧到达时最多等待 timeout，取不到返回 None"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.pending or self.closed, timeout)
+            return self.pending.popleft() if self.pending else None
+
+
+class SourceClock:
+    """
+    按源时间戳统计到达时刻: 以单次连接内到达最早 (相对 pts) 的帧为基准，
+    估算每帧比基准晚到多少 (解码与网络抖动造成的积压)，并由 pts 间隔估算源帧率
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.base = None
+        self.last_pts = None
+        self.fps = 0.0
+
+    def arrive(self, pts):
+        """记录一帧到达，返回 (到达时刻 monotonic, 相对基准的滞后 ms)"""
+        now = time.monotonic()
+        if pts is None:
+            return now, 0.0
+        if self.last_pts is not None and pts < self.last_pts:
+            # 时间戳回绕或源端重置，重新取基准
+            self.base = None
+        elif self.last_pts is not None and pts > self.last_pts:
+            inst = 1.0 / (pts - self.last_pts)
+            self.fps = inst if self.fps == 0 else self.fps * 0.9 + inst * 0.1
+        self.last_pts = pts
+        offset = now - pts
+        if self.base is None or offset < self.base:
+            self.base = offset
+        return now, (offset - self.base) * 1000
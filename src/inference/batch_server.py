@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchInferenceServer:
+    """
+    单设备动态批处理推理服务
+    各路流在自己的线程里做预处理/后处理，只把 session.run 汇总成一个 batch:
+    凑满 max_batch_size 帧或等待超过 max_wait_ms 即执行一次
+    对外接口与 ONNXDetector.infer 一致，可直接替换 AiStreamer 里的 detector
+    """
+
+    def __init__(self, detector, logger, gpu_id, max_batch_size=8, max_wait_ms=10):
+        self.detector = detector
+        self.logger = logger
+        self.gpu_id = gpu_id
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self.input_size = detector.input_size
+
+        # 固定 batch=1 的模型无法拼 batch，只能在工作线程里逐帧执行
+        self.batched = detector.supports_batch
+        if not self.batched:
+            self.logger.warning(f"GPU[{gpu_id}] 模型不支持动态 batch，批处理退化为逐帧串行执行")
+
+        self.requests = queue.Queue()
+        # 正在 infer 中、尚未拿到结果的输入数量，已全部到齐时无需再等 max_wait
+        self.inflight = 0
+        self.inflight_lock = threading.Lock()
+        self.running = True
+        self.batch_count = 0
+        self.frame_count = 0
+        self.worker = threading.Thread(target=self._worker, daemon=True)
+        self.worker.start()
+
+    def submit(self, blob):
+        """提交一张预处理好的 [1, 3, H, W] 输入，返回 Future，结果为该帧的原始输出"""
+        future = Future()
+        self.requests.put((blob, future))
+        return future
+
+    def infer(self, frame, model_input=None):
+        with self.inflight_lock:
+            self.inflight += 1
+        pending = 1
+        try:
+            # 切片模式下一帧会拆成多个输入，逐个提交后一起等待
+            blobs, ctx = self.detector.prepare(frame, model_input)
+            with self.inflight_lock:
+                self.inflight += len(blobs) - pending
+            pending = len(blobs)
+            futures = [self.submit(blob) for blob in blobs]
+            outputs = [future.result() for future in futures]
+        finally:
+            with self.inflight_lock:
+                self.inflight -= pending
+        return self.detector.finish(outputs, ctx)
+
+    def warmup(self):
+        # 按最大 batch 空跑，显存按最大输入一次分配好
+        self.detector.warmup(self.max_batch_size)
+
+    def close(self):
+        self.running = False
+        self.worker.join(timeout=1)
+
+    def _collect(self):
+        try:
+            first = self.requests.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < min(self.max_batch_size, self.inflight):
+            remain = deadline - time.perf_counter()
+            if remain <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remain))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            blobs = [blob for blob, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                if self.batched:
+                    outputs = self.detector.run(np.concatenate(blobs, axis=0))
+                else:
+                    outputs = [self.detector.run(blob)[0] for blob in blobs]
+            except Exception as e:
+                self.logger.error(f"GPU[{self.gpu_id}] 批量推理失败: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            # 结果分发回各路流
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+            self.batch_count += 1
+            self.frame_count += len(batch)
+
+        # 退出时唤醒仍在等待的调用方
+        while not self.requests.empty():
+            _, future = self.requests.get_nowait()
+            future.set_exception(RuntimeError("推理服务已关闭"))
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+
+from src.inference.detector import ONNXDetector
+
+
+class CpuDetectorPool:
+    """
+    CPU 环境共享的推理会话池
+    固定数量的 ONNXDetector 供所有任务复用，infer 时借出空闲会话，用完归还
+    准入按实测的剩余推理能力判断: 容量 = 会话数 * 1000 / 平均单次耗时(ms)
+    """
+
+    def __init__(self, config, logger):
+        pool_cfg = config.get('cpu_pool', {})
+        self.logger = logger
+        self.sessions = max(1, int(pool_cfg.get('sessions', 2)))
+        self.max_tasks = int(pool_cfg.get('max_tasks', 8))
+        self.target_utilization = float(pool_cfg.get('target_utilization', 0.9))
+        self.fps = float(config['video'].get('fps', 25))
+        self.stride = config.get('inference', {}).get('stride', 2)
+
+        t0 = time.perf_counter()
+        self.detectors = [
+            ONNXDetector(
+                config,
+                gpu_id=-1,
+                intra_op_num_threads=pool_cfg.get('intra_op_num_threads', 0),
+                inter_op_num_threads=pool_cfg.get('inter_op_num_threads', 0),
+            )
+            for _ in range(self.sessions)
+        ]
+        self.logger.info(f"CPU 推理池就绪: {self.sessions} 个会话, 耗时 {time.perf_counter() - t0:.2f}s")
+
+        self.idle = queue.Queue()
+        for detector in self.detectors:
+            self.idle.put(detector)
+        self.input_size = self.detectors[0].input_size
+
+        # task_id -> 该任务需要的推理帧率
+        self.demand = {}
+        self.task_count = 0
+        self.lock = threading.Lock()
+        self.avg_infer_ms = 0.0
+        self.rate = 0.0  # 实测推理帧率
+        self._window_start = time.perf_counter()
+        self._window_calls = 0
+
+    def infer(self, frame, model_input=None):
+        detector = self.idle.get()
+        t0 = time.perf_counter()
+        try:
+            return detector.infer(frame, model_input)
+        finally:
+            self.idle.put(detector)
+            self._record((time.perf_counter() - t0) * 1000)
+
+    def _record(self, cost_ms):
+        with self.lock:
+            self.avg_infer_ms = cost_ms if self.avg_infer_ms == 0 else self.avg_infer_ms * 0.9 + cost_ms * 0.1
+            self._window_calls += 1
+            now = time.perf_counter()
+            if now - self._window_start >= 2.0:
+                self.rate = self._window_calls / (now - self._window_start)
+                self._window_calls = 0
+                self._window_start = now
+
+    def capacity(self):
+        """池的最大推理帧率，尚无实测数据时返回 None"""
+        if self.avg_infer_ms <= 0:
+            return None
+        return self.sessions * 1000.0 / self.avg_infer_ms * self.target_utilization
+
+    def task_infer_fps(self, options=None):
+        """任务需要的推理帧率，按任务自己的推理间隔 (infer_stride) 计算"""
+        stride = max(1, int((options or {}).get('infer_stride') or self.stride))
+        return self.fps / stride
+
+    def free_capacity(self):
+        cap = self.capacity()
+        if cap is None:
+            return None
+        # 实测帧率可能滞后于刚启动的任务，取二者较大值
+        demand = max(self.rate, sum(self.demand.values()))
+        return cap - demand
+
+    def acquire(self, task_id, options=None):
+        with self.lock:
+            if self.task_count >= self.max_tasks:
+                self.logger.warning(f"CPU 推理池任务数已达上限 {self.max_tasks}")
+                return False
+            need = self.task_infer_fps(options)
+            free = self.free_capacity()
+            if free is not None and free < need:
+                self.logger.warning(
+                    f"CPU 推理池剩余能力不足: 剩余 {free:.1f} fps, 该任务需要 {need:.1f} fps")
+                return False
+            self.demand[task_id] = need
+            self.task_count = len(self.demand)
+            self.logger.info(f"CPU 推理池当前任务数: {self.task_count}")
+            return True
+
+    def release(self, task_id):
+        with self.lock:
+            self.demand.pop(task_id, None)
+            self.task_count = len(self.demand)
+            self.logger.info(f"CPU 推理池释放任务，剩余: {self.task_count}")
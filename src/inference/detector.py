@@ -1,9 +1,85 @@
+import threading
+
 import cv2
 import numpy as np
 import onnxruntime as ort
 
+# gbrp 平面顺序为 G, B, R，模型输入为 R, G, B
+GBRP_TO_RGB = (2, 0, 1)
+
+
+def letterbox_params(h, w, input_size):
+    """返回 scale, (缩放后宽, 高), 左右单边填充 dw, 上下单边填充 dh"""
+    scale = min(input_size[0] / h, input_size[1] / w)
+    new_pad = (int(round(w * scale)), int(round(h * scale)))
+    dw, dh = (input_size[1] - new_pad[0]) / 2, (input_size[0] - new_pad[1]) / 2
+    return scale, new_pad, dw, dh
+
+
+def letterbox(frame, input_size):
+    h, w = frame.shape[:2]
+    # 1. 预处理 (Letterbox)
+    scale, new_pad, dw, dh = letterbox_params(h, w, input_size)
+    
+    img = cv2.resize(frame, new_pad, interpolation=cv2.INTER_LINEAR)
+    img = cv2.copyMakeBorder(img, int(round(dh - 0.1)), int(round(dh + 0.1)), 
+                             int(round(dw - 0.1)), int(round(dw + 0.1)), 
+                             cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    
+    blob = img.transpose(2, 0, 1) # HWC to CHW
+    blob = np.expand_dims(blob, axis=0).astype(np.float32) / 255.0
+    return blob, scale, dw, dh
+
+
+def planar_to_blob(planes, blob=None):
+    """
+    planes: FFmpeg 已完成 letterbox 的 gbrp 平面数据 [3, H, W] (G, B, R 顺序)
+    只剩归一化，不再需要缩放、填充和转置
+    blob: 可选的预分配 [1, 3, H, W] float32 输出
+    """
+    if blob is None:
+        blob = np.empty((1, 3) + planes.shape[1:], dtype=np.float32)
+    for dst, src in enumerate(GBRP_TO_RGB):
+        np.divide(planes[src], np.float32(255), out=blob[0, dst])
+    return blob
+
+
+class _BoundBuffers:
+    """单个线程在某一帧尺寸下复用的输入/输出缓冲与 IOBinding"""
+
+    def __init__(self, session, input_name, input_size, frame_shape):
+        in_h, in_w = input_size
+        self.scale, (self.new_w, self.new_h), self.dw, self.dh = letterbox_params(
+            frame_shape[0], frame_shape[1], input_size)
+        top, left = int(round(self.dh - 0.1)), int(round(self.dw - 0.1))
+
+        # 填充区域只需写一次，之后每帧只把缩放结果写进中间区域
+        self.canvas = np.full((in_h, in_w, 3), 114, dtype=np.uint8)
+        self.roi = self.canvas[top:top + self.new_h, left:left + self.new_w]
+        self.blob = np.empty((1, 3, in_h, in_w), dtype=np.float32)
+
+        self.binding = session.io_binding()
+        self.binding.bind_ortvalue_input(input_name, ort.OrtValue.ortvalue_from_numpy(self.blob))
+        output = session.get_outputs()[0]
+        shape = [1 if not isinstance(d, int) else d for d in output.shape]
+        if all(isinstance(d, int) for d in output.shape[1:]):
+            self.output = np.empty(shape, dtype=np.float32)
+            self.binding.bind_ortvalue_output(output.name, ort.OrtValue.ortvalue_from_numpy(self.output))
+        else:
+            # 输出尺寸不固定时只能由 onnxruntime 分配
+            self.output = None
+            self.binding.bind_output(output.name, 'cpu')
+
+    def load_frame(self, frame):
+        cv2.resize(frame, (self.new_w, self.new_h), dst=self.roi, interpolation=cv2.INTER_LINEAR)
+        np.divide(self.canvas.transpose(2, 0, 1), np.float32(255), out=self.blob[0])
+
+    def load_planar(self, planes):
+        planar_to_blob(planes, self.blob)
+
+
 class ONNXDetector:
-    def __init__(self, config, gpu_id=0):
+    def __init__(self, config, gpu_id=0, intra_op_num_threads=0, inter_op_num_threads=0):
         self.gpu_id = gpu_id
         self.cfg = config['model']
         self.device_type = config.get('device_type', 'cpu').lower()
@@ -39,65 +115,200 @@ class ONNXDetector:
         #     ]
         # )
 
+        # 线程数为 0 时由 onnxruntime 自行决定
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = intra_op_num_threads
+        sess_options.inter_op_num_threads = inter_op_num_threads
+
         try:
-            self.session = ort.InferenceSession(self.cfg['path'], providers=providers)
+            self.session = ort.InferenceSession(self.cfg['path'], sess_options, providers=providers)
             active_providers = self.session.get_providers()
             print(f"ONNX Session 启动成功。激活的 Providers: {active_providers}")
         except Exception as e:
             print(f"初始化 ONNX 失败，尝试回退到纯 CPU 模式。错误: {e}")
-            self.session = ort.InferenceSession(self.cfg['path'], providers=['CPUExecutionProvider'])
+            self.session = ort.InferenceSession(self.cfg['path'], sess_options, providers=['CPUExecutionProvider'])
 
         self.input_name = self.session.get_inputs()[0].name
         self.input_size = self.cfg['input_size']
 
-    def infer(self, frame):
-        h, w = frame.shape[:2]
-        # 1. 预处理 (Letterbox)
-        scale = min(self.input_size[0] / h, self.input_size[1] / w)
-        new_pad = (int(round(w * scale)), int(round(h * scale)))
-        dw, dh = (self.input_size[1] - new_pad[0]) / 2, (self.input_size[0] - new_pad[1]) / 2
-        
-        img = cv2.resize(frame, new_pad, interpolation=cv2.INTER_LINEAR)
-        img = cv2.copyMakeBorder(img, int(round(dh - 0.1)), int(round(dh + 0.1)), 
-                                 int(round(dw - 0.1)), int(round(dw + 0.1)), 
-                                 cv2.BORDER_CONSTANT, value=(114, 114, 114))
-        
-        blob = img.transpose(2, 0, 1) # HWC to CHW
-        blob = np.expand_dims(blob, axis=0).astype(np.float32) / 255.0
-        
-        # 2. 推理
-        outputs = self.session.run(None, {self.input_name: blob})[0] # [1, 25200, 85]
+        # 切片推理: 把整帧切成带重叠的网格分别推理，提升小目标召回
+        tiling = self.cfg.get('tiling', {})
+        self.tiling = tiling.get('enabled', False)
+        self.tile_grid = tiling.get('grid', [2, 2])
+        self.tile_overlap = tiling.get('overlap', 0.2)
+        self.tile_include_full = tiling.get('include_full', True)
+
+        # 预分配输入张量 + IOBinding，单帧推理热路径上不再分配内存
+        # 同一设备的 detector 会被多路流并发调用，缓冲按线程各自持有
+        self.io_binding = self.cfg.get('io_binding', False)
+        self._local = threading.local()
+
+    @property
+    def supports_batch(self):
+        # 动态 batch 的模型第 0 维是符号或 None
+        return not isinstance(self.session.get_inputs()[0].shape[0], int)
+
+    def warmup(self, batch=1):
+        """空跑一次，提前完成显存分配和算子初始化，第一帧推理不再额外耗时"""
+        h, w = self.input_size
+        self.run(np.zeros((batch if self.supports_batch else 1, 3, h, w), dtype=np.float32))
+
+    def preprocess(self, frame):
+        return letterbox(frame, self.input_size)
+
+    def preprocess_planar(self, planes, frame_shape):
+        scale, _, dw, dh = letterbox_params(frame_shape[0], frame_shape[1], self.input_size)
+        return planar_to_blob(planes), scale, dw, dh
+
+    def run(self, blob):
+        # 2. 推理, blob: [B, 3, H, W] -> [B, 25200, 85]
+        return self.session.run(None, {self.input_name: blob})[0]
+
+    def run_many(self, blobs):
+        """多张 [1, 3, H, W] 输入，模型支持动态 batch 时合并为一次 session.run"""
+        if len(blobs) == 1:
+            return self.run(blobs[0])
+        if self.supports_batch:
+            return self.run(np.concatenate(blobs, axis=0))
+        return [self.run(blob)[0] for blob in blobs]
+
+    def tile_regions(self, h, w):
+        """按网格和重叠比例切分整帧，返回 [(x0, y0, x1, y1), ...]"""
+        cols, rows = self.tile_grid
+        regions = []
+        tw = int(np.ceil(w / (cols - (cols - 1) * self.tile_overlap)))
+        th = int(np.ceil(h / (rows - (rows - 1) * self.tile_overlap)))
+        for r in range(rows):
+            for c in range(cols):
+                x0 = min(int(round(c * tw * (1 - self.tile_overlap))), w - tw)
+                y0 = min(int(round(r * th * (1 - self.tile_overlap))), h - th)
+                regions.append((x0, y0, x0 + tw, y0 + th))
+        if self.tile_include_full:
+            regions.append((0, 0, w, h))
+        return regions
+
+    def prepare(self, frame, model_input=None):
+        """
+        生成模型输入: 返回 (blob 列表, 还原坐标用的上下文)
+        切片模式下每个切片一个 blob，此时忽略 FFmpeg 给出的整帧 model_input
+        """
+        if self.tiling:
+            h, w = frame.shape[:2]
+            blobs, ctx = [], []
+            for x0, y0, x1, y1 in self.tile_regions(h, w):
+                blob, scale, dw, dh = self.preprocess(frame[y0:y1, x0:x1])
+                blobs.append(blob)
+                ctx.append((x0, y0, scale, dw, dh))
+            return blobs, ctx
+        if model_input is not None:
+            blob, scale, dw, dh = self.preprocess_planar(model_input, frame.shape)
+        else:
+            blob, scale, dw, dh = self.preprocess(frame)
+        return [blob], [(0, 0, scale, dw, dh)]
+
+    def finish(self, outputs, ctx):
+        """后处理，返回 (detections, scale, pad_w, pad_h)"""
+        if not self.tiling:
+            _, _, scale, dw, dh = ctx[0]
+            return self.postprocess(outputs[0]), scale, dw, dh
+
+        # 各切片结果还原到整帧坐标后跨切片 NMS，坐标已是原图坐标，scale=1 且无填充
+        boxes, scores, class_ids = [], [], []
+        for output, (x0, y0, scale, dw, dh) in zip(outputs, ctx):
+            dets = self.postprocess(output)
+            if not dets:
+                continue
+            d = np.asarray(dets, dtype=np.float64)
+            boxes.append(np.stack([
+                (d[:, 0] - dw) / scale + x0, (d[:, 1] - dh) / scale + y0,
+                (d[:, 2] - d[:, 0]) / scale, (d[:, 3] - d[:, 1]) / scale,
+            ], axis=1))
+            scores.append(d[:, 4])
+            class_ids.append(d[:, 5].astype(np.int64))
+        if not boxes:
+            return [], 1.0, 0, 0
+
+        boxes = np.concatenate(boxes)
+        scores = np.concatenate(scores).astype(np.float32)
+        class_ids = np.concatenate(class_ids)
+        idx = self._nms(boxes, scores, class_ids)
+        b = boxes[idx]
+        final_dets = [
+            [x, y, x + bw, y + bh, c, k]
+            for (x, y, bw, bh), c, k in zip(b.tolist(), scores[idx].tolist(), class_ids[idx].tolist())
+        ]
+        return final_dets, 1.0, 0, 0
+
+    def _bound_buffers(self, frame_shape):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or self._local.frame_shape != frame_shape:
+            buffers = _BoundBuffers(self.session, self.input_name, self.input_size, frame_shape)
+            self._local.buffers, self._local.frame_shape = buffers, frame_shape
+        return buffers
+
+    def _infer_bound(self, frame, model_input):
+        buffers = self._bound_buffers(frame.shape)
+        if model_input is not None:
+            buffers.load_planar(model_input)
+        else:
+            buffers.load_frame(frame)
+        self.session.run_with_iobinding(buffers.binding)
+        output = buffers.output if buffers.output is not None else buffers.binding.copy_outputs_to_cpu()[0]
+        return self.postprocess(output[0]), buffers.scale, buffers.dw, buffers.dh
+
+    def infer(self, frame, model_input=None):
+        if self.io_binding and not self.tiling:
+            return self._infer_bound(frame, model_input)
+        blobs, ctx = self.prepare(frame, model_input)
+        outputs = self.run_many(blobs)
         
         # 3. 后处理 (NMS)
-        predictions = np.squeeze(outputs)
+        return self.finish(outputs, ctx)
+
+    def _nms(self, boxes, scores, class_ids):
+        """boxes: [N, 4] (x, y, w, h)，返回保留的下标数组"""
+        # 执行非极大值抑制 (去重)，默认与类别无关；关闭后按类别分别抑制
+        conf_thres, iou_thres = self.cfg['conf_threshold'], self.cfg['iou_threshold']
+        if self.cfg.get('class_agnostic_nms', True):
+            indices = cv2.dnn.NMSBoxes(boxes, scores, conf_thres, iou_thres)
+        else:
+            indices = cv2.dnn.NMSBoxesBatched(boxes, scores, class_ids, conf_thres, iou_thres)
+        return np.asarray(indices, dtype=np.int64).flatten()
+
+    def postprocess(self, predictions):
+        """
+        predictions: [N, 5 + num_classes] (cx, cy, w, h, obj, cls...)
+        返回 [[x1, y1, x2, y2, conf, cls_id], ...]，全程向量化，不逐行循环
+        """
+        conf_thres = self.cfg['conf_threshold']
         # 过滤置信度 (第5列是 objectness)
-        mask = predictions[:, 4] > self.cfg['conf_threshold']
-        valid_hits = predictions[mask]
-        
-        boxes, confs, class_ids = [], [], []
-        for hit in valid_hits:
-            # 计算类分数: 类别独立分数 * 物体置信度
-            class_scores = hit[5:]
-            class_id = np.argmax(class_scores)
-            score = class_scores[class_id] * hit[4]
-            
-            if score > self.cfg['conf_threshold']:
-                cx, cy, bw, bh = hit[:4]
-                # 转换为左上角坐标 [x, y, w, h]
-                lx = cx - bw/2
-                ly = cy - bh/2
-                boxes.append([float(lx), float(ly), float(bw), float(bh)])
-                confs.append(float(score))
-                class_ids.append(int(class_id))
-
-        # 执行非极大值抑制 (去重)
-        indices = cv2.dnn.NMSBoxes(boxes, confs, self.cfg['conf_threshold'], self.cfg['iou_threshold'])
-        
-        final_dets = []
-        if len(indices) > 0:
-            for i in indices.flatten():
-                b = boxes[i]
-                # 封装为 6 个值的格式: [x1, y1, x2, y2, conf, cls_id]
-                final_dets.append([b[0], b[1], b[0]+b[2], b[1]+b[3], confs[i], class_ids[i]])
-        
-        return final_dets, scale, dw, dh
\ No newline at end of file
+        hits = predictions[predictions[:, 4] > conf_thres]
+        if len(hits) == 0:
+            return []
+
+        # 计算类分数: 类别独立分数 * 物体置信度
+        class_ids = np.argmax(hits[:, 5:], axis=1)
+        scores = hits[np.arange(len(hits)), 5 + class_ids] * hits[:, 4]
+
+        keep = scores > conf_thres
+        if not np.any(keep):
+            return []
+        hits, scores, class_ids = hits[keep], scores[keep], class_ids[keep]
+
+        # 转换为左上角坐标 [x, y, w, h]
+        boxes = np.empty((len(hits), 4), dtype=np.float32)
+        boxes[:, 0] = hits[:, 0] - hits[:, 2] / 2
+        boxes[:, 1] = hits[:, 1] - hits[:, 3] / 2
+        boxes[:, 2:] = hits[:, 2:4]
+
+        idx = self._nms(boxes, scores, class_ids)
+        if len(idx) == 0:
+            return []
+
+        b = boxes[idx].astype(np.float64)
+        # 封装为 6 个值的格式: [x1, y1, x2, y2, conf, cls_id]
+        x1y1 = b[:, :2].tolist()
+        x2y2 = (b[:, :2] + b[:, 2:]).tolist()
+        confs = scores[idx].tolist()
+        cls_ids = class_ids[idx].tolist()
+        return [[p[0], p[1], q[0], q[1], c, k] for p, q, c, k in zip(x1y1, x2y2, confs, cls_ids)]
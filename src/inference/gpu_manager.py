@@ -1,44 +1,179 @@
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from src.inference.detector import ONNXDetector
+from src.inference.batch_server import BatchInferenceServer
+from src.inference.cpu_pool import CpuDetectorPool
+from src.inference.placement import PlacementPolicy
 
 class GpuManager:
-    def __init__(self, config, logger, max_tasks_per_gpu=2):
+    def __init__(self, config, logger):
         self.cfg = config
         self.logger = logger
         self.device_ids = config.get('device_ids', [0])
         self.device_type = config.get('device_type', 'cpu').lower()
-        self.max_tasks_per_gpu = max_tasks_per_gpu
+        # 按实测的单路推理开销和设备预算放置任务 (CPU 推理池自带按实测能力准入)
+        self.placement = PlacementPolicy(self.device_ids, config) if self.device_type != 'cpu' else None
+        self.batch_cfg = config.get('batching', {})
 
+        self.cpu_pool = None
         self.detectors = {}
         self.task_counts = {gid: 0 for gid in self.device_ids}
         self.lock = threading.Lock()
 
-    def acquire(self):
+    def acquire(self, task_id, options=None):
         if self.device_type == 'cpu':
-            return ONNXDetector(self.cfg, gpu_id=-1), -1
+            return self._acquire_cpu(task_id, options)
 
         with self.lock:
-            candidates = [
-                gid for gid, cnt in self.task_counts.items()
-                if cnt < self.max_tasks_per_gpu
-            ]
-
-            if not candidates:
+            gpu_id = self.placement.place(task_id, options)
+            if gpu_id is None:
+                self.logger.warning(f"各设备剩余推理能力不足: {self._load_summary()}")
                 return None, None
 
-            gpu_id = min(candidates, key=lambda g: self.task_counts[g])
-
             if gpu_id not in self.detectors:
-                self.detectors[gpu_id] = ONNXDetector(self.cfg, gpu_id)
+                try:
+                    self.detectors[gpu_id] = self._create_detector(gpu_id)
+                except Exception:
+                    self.placement.release(task_id)
+                    raise
 
             self.task_counts[gpu_id] += 1
-            self.logger.info(f"GPU[{gpu_id}] 当前任务数: {self.task_counts[gpu_id]}")
+            self.logger.info(f"GPU[{gpu_id}] 当前任务数: {self.task_counts[gpu_id]}, 负载: {self._load_summary()}")
 
             return self.detectors[gpu_id], gpu_id
 
-    def release(self, gpu_id):
+    def migrate(self, task_id, target=None):
+        """
+        把任务的推理迁移到另一个设备，target 为空时选剩余能力最多的设备
+        返回 (detector, 原设备, 目标设备)，无法迁移时返回 None
+        """
+        if self.placement is None:
+            return None
+        with self.lock:
+            moved = self.placement.move(task_id, target)
+            if moved is None:
+                return None
+            source, target = moved
+            if target not in self.detectors:
+                try:
+                    self.detectors[target] = self._create_detector(target)
+                except Exception:
+                    self.placement.move(task_id, source)
+                    raise
+            self.task_counts[source] = max(0, self.task_counts[source] - 1)
+            self.task_counts[target] += 1
+            self.logger.info(f"任务 {task_id} 推理迁移 GPU[{source}] -> GPU[{target}], 负载: {self._load_summary()}")
+            return self.detectors[target], source, target
+
+    def plan_rebalance(self, threshold):
+        """设备间负载差距超过 threshold 时返回 (task_id, 原设备, 目标设备)"""
+        if self.placement is None:
+            return None
+        return self.placement.plan_rebalance(threshold)
+
+    def update_load(self, task_id, infer_ms_total, infers, memory_mb=None):
+        """任务上报的实测推理开销，CPU 推理池自行统计"""
+        if self.placement is not None:
+            self.placement.update(task_id, infer_ms_total, infers, memory_mb)
+
+    def _load_summary(self):
+        return ', '.join(f"GPU[{gid}] {load['compute_ms']:.0f}/{load['compute_budget_ms']:.0f}ms"
+                         for gid, load in self.placement.snapshot().items())
+
+    def _acquire_cpu(self, task_id, options=None):
+        with self.lock:
+            if self.cpu_pool is None:
+                self.cpu_pool = CpuDetectorPool(self.cfg, self.logger)
+        if not self.cpu_pool.acquire(task_id, options):
+            return None, None
+        return self.cpu_pool, -1
+
+    def prewarm(self):
+        """
+        恢复任务前预先加载各设备的模型并空跑一次，各设备并行，返回耗时 (s)
+        之后任务准入不再在锁内加载模型，第一帧推理也不再额外耗时
+        """
+        t0 = time.perf_counter()
+        if self.device_type == 'cpu':
+            with self.lock:
+                if self.cpu_pool is None:
+                    self.cpu_pool = CpuDetectorPool(self.cfg, self.logger)
+            for detector in self.cpu_pool.detectors:
+                detector.warmup()
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.device_ids)) as pool:
+                created = dict(zip(self.device_ids, pool.map(self._warm_detector, self.device_ids)))
+            with self.lock:
+                for gpu_id, detector in created.items():
+                    if self.detectors.setdefault(gpu_id, detector) is not detector and \
+                            isinstance(detector, BatchInferenceServer):
+                        # 预热期间已有任务在该设备上创建了推理服务
+                        detector.close()
+        cost = time.perf_counter() - t0
+        self.logger.info(f"推理后端预热完成, 耗时 {cost:.2f}s")
+        return cost
+
+    def _warm_detector(self, gpu_id):
+        detector = self.detectors.get(gpu_id) or self._create_detector(gpu_id)
+        detector.warmup()
+        return detector
+
+    def _create_detector(self, gpu_id):
+        detector = ONNXDetector(self.cfg, gpu_id)
+        if not self.batch_cfg.get('enabled', False):
+            return detector
+
+        # 同一设备上的多路流共用一个批处理推理服务
+        self.logger.info(f"GPU[{gpu_id}] 启用动态批处理 "
+                         f"max_batch_size={self.batch_cfg.get('max_batch_size', 8)} "
+                         f"max_wait_ms={self.batch_cfg.get('max_wait_ms', 10)}")
+        return BatchInferenceServer(
+            detector,
+            self.logger,
+            gpu_id,
+            max_batch_size=self.batch_cfg.get('max_batch_size', 8),
+            max_wait_ms=self.batch_cfg.get('max_wait_ms', 10),
+        )
+
+    def device_metrics(self):
+        """各设备的任务数与推理服务统计，返回 [(labels, gauges), ...]"""
+        devices = []
+        if self.cpu_pool is not None:
+            pool = self.cpu_pool
+            devices.append(({'device': -1}, {
+                'tasks': pool.task_count,
+                'sessions': pool.sessions,
+                'avg_infer_ms': pool.avg_infer_ms,
+                'infer_rate': pool.rate,
+                'infer_capacity': pool.capacity() or 0,
+            }))
+        if self.device_type == 'cpu':
+            return devices
+        loads = self.placement.snapshot()
+        with self.lock:
+            for gpu_id, count in self.task_counts.items():
+                load = loads[gpu_id]
+                gauges = {
+                    'tasks': count,
+                    'compute_ms': load['compute_ms'],
+                    'compute_budget_ms': load['compute_budget_ms'],
+                    'headroom': load['headroom'],
+                    'memory_mb': load['memory_mb'],
+                }
+                detector = self.detectors.get(gpu_id)
+                if isinstance(detector, BatchInferenceServer):
+                    gauges['batches'] = detector.batch_count
+                    gauges['batched_frames'] = detector.frame_count
+                devices.append(({'device': gpu_id}, gauges))
+        return devices
+
+    def release(self, gpu_id, task_id):
         if gpu_id == -1:
+            if self.cpu_pool is not None:
+                self.cpu_pool.release(task_id)
             return
+        self.placement.release(task_id)
         with self.lock:
             self.task_counts[gpu_id] = max(0, self.task_counts[gpu_id] - 1)
             self.logger.info(f"GPU[{gpu_id}] 释放任务，剩余: {self.task_counts[gpu_id]}")
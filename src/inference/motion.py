@@ -0,0 +1,50 @@
+import time
+
+import cv2
+
+
+class MotionGate:
+    """
+    推理前的运动门控: 把帧缩成很小的灰度图，与上次推理时的参考图做差分
+    变化像素占比低于阈值时跳过推理、沿用上次检测结果，超过 max_interval_s 强制推理一次
+    与参考图 (而不是上一帧) 比较，缓慢变化累积到阈值也能触发
+    """
+
+    def __init__(self, config):
+        cfg = config.get('motion_gate', {})
+        self.size = tuple(cfg.get('size', [64, 36]))
+        self.pixel_threshold = cfg.get('pixel_threshold', 15)   # 单像素灰度差超过多少算变化
+        self.area_threshold = cfg.get('area_threshold', 0.002)  # 变化像素占比超过多少算有运动
+        self.max_interval = cfg.get('max_interval_s', 2.0)
+
+        self.reference = None
+        self.last_infer = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    def should_infer(self, frame):
+        """frame: RGB 帧，或 YUV 模式下的 Y 平面"""
+        # 先最近邻抽样到 4 倍尺寸再区域平均，比整帧 INTER_AREA 快一个数量级，同时抑制噪点
+        sample = cv2.resize(frame, (self.size[0] * 4, self.size[1] * 4), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(sample, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        now = time.monotonic()
+        self.checked += 1
+
+        if self.reference is not None and now - self.last_infer < self.max_interval:
+            diff = cv2.absdiff(small, self.reference)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            if changed < self.area_threshold * diff.size:
+                self.skipped += 1
+                return False
+
+        self.reference = small
+        self.last_infer = now
+        return True
+
+    def pop_skip_ratio(self):
+        """返回并清零本统计窗口的跳过比例"""
+        ratio = self.skipped / self.checked if self.checked else 0.0
+        self.checked = self.skipped = 0
+        return ratio
@@ -0,0 +1,193 @@
+import threading
+import time
+
+
+class PlacementPolicy:
+    """
+    按实测负载选择设备
+    每个设备有计算预算 (每秒可用的推理时间 ms) 和可选的内存预算 (任务帧缓冲 MB)，
+    每路任务的计算开销 = 实测推理耗时累计 / 墙钟时间，即每秒占用设备的推理时间，
+    刚启动、尚无实测数据的任务按 单帧推理耗时 x 推理帧率 估算预留
+    新任务放到放得下、且剩余计算预算最多的设备上，都放不下时返回 None
+    只处理传入的数据，不访问设备，可以直接用模拟负载测试
+    """
+
+    def __init__(self, device_ids, config):
+        cfg = config.get('placement', {})
+        video = config.get('video', {})
+        budget = float(cfg.get('compute_budget_ms', 900))
+        # 异构设备可单独指定预算，例如 {0: 900, 1: 1800}
+        overrides = cfg.get('device_budgets_ms') or {}
+        self.budgets = {gid: float(overrides.get(gid, budget)) for gid in device_ids}
+        self.memory_budget = float(cfg.get('memory_budget_mb', 0))
+        self.max_tasks = int(cfg.get('max_tasks', 16))
+        self.default_infer_ms = float(cfg.get('default_infer_ms', 20))
+        self.smoothing = float(cfg.get('smoothing', 0.3))
+        # 两次采样间隔太短时推理次数太少，不更新实测值
+        self.min_window = float(cfg.get('min_window_s', 2.0))
+        self.fps = float(video.get('fps', 25))
+        self.stride = config.get('inference', {}).get('stride', 2)
+        # 估算内存按原始分辨率 rgb24 帧缓冲 (环形缓冲 + 占位画面两帧) 计算，启动后以实测值替换
+        self.frame_mb = video.get('width', 1920) * video.get('height', 1080) * 3 / (1 << 20)
+        self.slots = video.get('ring_slots', 4)
+
+        # device -> {task_id: load}
+        self.devices = {gid: {} for gid in device_ids}
+        self.lock = threading.Lock()
+
+    def estimate(self, device, options=None):
+        """新任务在该设备上的预计开销"""
+        options = options or {}
+        stride = options.get('infer_stride') or self.stride
+        return {
+            'compute_ms': self._infer_ms(device) * self.fps / stride,
+            'memory_mb': self.frame_mb * (self.slots + 2),
+        }
+
+    def _infer_ms(self, device):
+        """设备上已实测任务的平均单帧推理耗时，没有时取所有设备的平均值，再没有取默认值"""
+        for loads in ([self.devices[device]], self.devices.values()):
+            measured = [t['infer_ms'] for tasks in loads for t in tasks.values() if t['infer_ms']]
+            if measured:
+                return sum(measured) / len(measured)
+        return self.default_infer_ms
+
+    def _used(self, device, key):
+        return sum(t[key] for t in self.devices[device].values())
+
+    def headroom(self, device):
+        """剩余计算预算占比，可能为负 (实测开销超出预算)"""
+        budget = self.budgets[device]
+        return (budget - self._used(device, 'compute_ms')) / budget if budget > 0 else 0.0
+
+    def fits(self, device, load):
+        tasks = self.devices[device]
+        if len(tasks) >= self.max_tasks:
+            return False
+        if self.budgets[device] - self._used(device, 'compute_ms') < load['compute_ms']:
+            return False
+        if self.memory_budget and self.memory_budget - self._used(device, 'memory_mb') < load['memory_mb']:
+            return False
+        return True
+
+    def place(self, task_id, options=None):
+        """选择设备并预留估算开销，没有放得下的设备时返回 None"""
+        with self.lock:
+            best, best_free = None, None
+            for device in self.devices:
+                load = self.estimate(device, options)
+                if not self.fits(device, load):
+                    continue
+                free = self.headroom(device) - load['compute_ms'] / self.budgets[device]
+                if best is None or free > best_free:
+                    best, best_free = device, free
+            if best is None:
+                return None
+            self.devices[best][task_id] = dict(self.estimate(best, options), infer_ms=None, sample=None)
+            return best
+
+    def update(self, task_id, infer_ms_total, infers, memory_mb=None, now=None):
+        """
+        上报任务的累计推理耗时 (ms) 和推理次数，两次上报之间的增量即实测开销
+        第一次上报只记录起点，之前一直按估算值计算
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            load = self._find(task_id)
+            if load is None:
+                return
+            if memory_mb is not None:
+                load['memory_mb'] = memory_mb
+            sample = load['sample']
+            if sample is None or infers < sample[2]:
+                # 第一次上报，或任务重启后计数归零
+                load['sample'] = (now, infer_ms_total, infers)
+                return
+            dt = now - sample[0]
+            if dt < self.min_window:
+                return
+            compute_ms = (infer_ms_total - sample[1]) / dt
+            n = infers - sample[2]
+            a = self.smoothing if load['infer_ms'] is not None else 1.0
+            load['compute_ms'] += (compute_ms - load['compute_ms']) * a
+            if n > 0:
+                infer_ms = (infer_ms_total - sample[1]) / n
+                load['infer_ms'] = infer_ms if load['infer_ms'] is None else \
+                    load['infer_ms'] + (infer_ms - load['infer_ms']) * self.smoothing
+            elif load['infer_ms'] is None:
+                # 整个窗口都没有推理 (静止画面跳过或断流)，也算已有实测
+                load['infer_ms'] = 0.0
+            load['sample'] = (now, infer_ms_total, infers)
+
+    def move(self, task_id, target=None):
+        """
+        把任务的开销记录移到另一个设备，target 为空时选放得下、剩余预算最多的设备
+        返回 (原设备, 目标设备)，任务不存在或没有放得下的设备时返回 None
+        """
+        with self.lock:
+            source = next((d for d, tasks in self.devices.items() if task_id in tasks), None)
+            if source is None:
+                return None
+            load = self.devices[source][task_id]
+            candidates = [target] if target is not None else [d for d in self.devices if d != source]
+            best, best_free = None, None
+            for device in candidates:
+                if device not in self.devices or device == source or not self.fits(device, load):
+                    continue
+                free = self.headroom(device)
+                if best is None or free > best_free:
+                    best, best_free = device, free
+            if best is None:
+                return None
+            self.devices[best][task_id] = self.devices[source].pop(task_id)
+            return source, best
+
+    def plan_rebalance(self, threshold):
+        """
+        剩余预算占比最高和最低的设备相差超过 threshold 时，从负载最重的设备挑一个已有实测数据的任务，
+        选迁移后两设备差距最小的那个；迁移后差距不缩小则不迁移
+        返回 (task_id, 原设备, 目标设备) 或 None
+        """
+        with self.lock:
+            if len(self.devices) < 2:
+                return None
+            headroom = {d: self.headroom(d) for d in self.devices}
+            source = min(headroom, key=headroom.get)
+            target = max(headroom, key=headroom.get)
+            gap = headroom[target] - headroom[source]
+            if gap <= threshold:
+                return None
+            best, best_gap = None, gap
+            for task_id, load in self.devices[source].items():
+                if load['infer_ms'] is None or not self.fits(target, load):
+                    continue
+                moved_gap = abs((headroom[target] - load['compute_ms'] / self.budgets[target]) -
+                                (headroom[source] + load['compute_ms'] / self.budgets[source]))
+                if moved_gap < best_gap:
+                    best, best_gap = task_id, moved_gap
+            return (best, source, target) if best is not None else None
+
+    def _find(self, task_id):
+        for tasks in self.devices.values():
+            if task_id in tasks:
+                return tasks[task_id]
+        return None
+
+    def release(self, task_id):
+        with self.lock:
+            for tasks in self.devices.values():
+                tasks.pop(task_id, None)
+
+    def snapshot(self):
+        """各设备的负载，供 /metrics 和日志使用"""
+        with self.lock:
+            return {
+                device: {
+                    'tasks': len(tasks),
+                    'compute_ms': self._used(device, 'compute_ms'),
+                    'compute_budget_ms': self.budgets[device],
+                    'headroom': self.headroom(device),
+                    'memory_mb': self._used(device, 'memory_mb'),
+                }
+                for device, tasks in self.devices.items()
+            }
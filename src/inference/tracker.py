@@ -0,0 +1,146 @@
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """a: [N, 4], b: [M, 4] (x1, y1, x2, y2) -> [N, M]"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def greedy_match(iou, threshold):
+    """按 IoU 从大到小贪心匹配，返回 [(track_idx, det_idx), ...]"""
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_r, used_c, matches = set(), set(), []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_r or c in used_c:
+            continue
+        used_r.add(r)
+        used_c.add(c)
+        matches.append((r, c))
+    return matches
+
+
+class Tracker:
+    """
+    SORT 风格多目标跟踪 (匀速 Kalman + IoU 关联)，所有轨迹的预测/更新按矩阵批量计算
+    状态: [cx, cy, w, h, vcx, vcy, vw, vh]，速度单位为 像素/帧
+    推理帧调用 update(detections)，跳过推理的帧调用 predict() 得到外推的框
+    """
+
+    def __init__(self, config):
+        cfg = config.get('tracker', {})
+        self.iou_threshold = cfg.get('iou_threshold', 0.3)
+        self.max_age = cfg.get('max_age', 10)    # 连续多少帧未匹配后删除轨迹
+        self.min_hits = cfg.get('min_hits', 1)   # 匹配多少次后才输出
+
+        self.F = np.eye(8, dtype=np.float64)
+        self.F[:4, 4:] = np.eye(4)
+        self.H = np.eye(4, 8, dtype=np.float64)
+        self.Q = np.diag([1, 1, 1, 1, 0.01, 0.01, 0.0001, 0.0001]).astype(np.float64)
+        self.R = np.diag([1, 1, 10, 10]).astype(np.float64)
+        self.P0 = np.diag([10, 10, 10, 10, 1000, 1000, 1000, 1000]).astype(np.float64)
+
+        self.x = np.zeros((0, 8))
+        self.P = np.zeros((0, 8, 8))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.conf = np.zeros(0)
+        self.cls = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.since_update = np.zeros(0, dtype=np.int64)
+        self.next_id = 1
+        self.frames_since_infer = 0
+
+    def _predict(self):
+        if len(self.x) == 0:
+            return
+        self.x = self.x @ self.F.T
+        # 宽高不能为负
+        self.x[:, 2:4] = np.maximum(self.x[:, 2:4], 1e-3)
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        self.since_update += 1
+
+    def _boxes(self):
+        cx, cy, w, h = self.x[:, 0], self.x[:, 1], self.x[:, 2], self.x[:, 3]
+        return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    def _output(self, max_since_update):
+        keep = (self.hits >= self.min_hits) & (self.since_update <= max_since_update)
+        if not np.any(keep):
+            return []
+        boxes = self._boxes()[keep].tolist()
+        return [
+            [b[0], b[1], b[2], b[3], c, k, t]
+            for b, c, k, t in zip(boxes, self.conf[keep].tolist(), self.cls[keep].tolist(), self.ids[keep].tolist())
+        ]
+
+    def predict(self):
+        """跳过推理的帧: 外推所有轨迹，只输出最近一次推理命中的轨迹"""
+        self._predict()
+        self.frames_since_infer += 1
+        return self._output(self.frames_since_infer)
+
+    def update(self, detections):
+        """
+        detections: [[x1, y1, x2, y2, conf, cls_id], ...]
+        返回 [[x1, y1, x2, y2, conf, cls_id, track_id], ...]
+        """
+        self._predict()
+        self.frames_since_infer = 0
+        dets = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+
+        matches = greedy_match(iou_matrix(self._boxes(), dets[:, :4]), self.iou_threshold)
+        if matches:
+            ti = np.array([m[0] for m in matches])
+            di = np.array([m[1] for m in matches])
+            z = np.stack([
+                (dets[di, 0] + dets[di, 2]) / 2, (dets[di, 1] + dets[di, 3]) / 2,
+                dets[di, 2] - dets[di, 0], dets[di, 3] - dets[di, 1],
+            ], axis=1)
+            P = self.P[ti]
+            S = self.H @ P @ self.H.T + self.R
+            K = P @ self.H.T @ np.linalg.inv(S)
+            y = z - self.x[ti] @ self.H.T
+            self.x[ti] = self.x[ti] + np.einsum('nij,nj->ni', K, y)
+            self.P[ti] = (np.eye(8) - K @ self.H) @ P
+            self.conf[ti] = dets[di, 4]
+            self.cls[ti] = dets[di, 5].astype(np.int64)
+            self.hits[ti] += 1
+            self.since_update[ti] = 0
+
+        # 未匹配的检测新建轨迹
+        unmatched = np.setdiff1d(np.arange(len(dets)), [m[1] for m in matches])
+        if len(unmatched):
+            d = dets[unmatched]
+            x = np.zeros((len(d), 8))
+            x[:, 0] = (d[:, 0] + d[:, 2]) / 2
+            x[:, 1] = (d[:, 1] + d[:, 3]) / 2
+            x[:, 2] = d[:, 2] - d[:, 0]
+            x[:, 3] = d[:, 3] - d[:, 1]
+            n = len(d)
+            self.x = np.concatenate([self.x, x])
+            self.P = np.concatenate([self.P, np.repeat(self.P0[None], n, axis=0)])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n)])
+            self.next_id += n
+            self.conf = np.concatenate([self.conf, d[:, 4]])
+            self.cls = np.concatenate([self.cls, d[:, 5].astype(np.int64)])
+            self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+            self.since_update = np.concatenate([self.since_update, np.zeros(n, dtype=np.int64)])
+
+        # 删除长期未匹配的轨迹
+        alive = self.since_update <= self.max_age
+        if not np.all(alive):
+            for name in ('x', 'P', 'ids', 'conf', 'cls', 'hits', 'since_update'):
+                setattr(self, name, getattr(self, name)[alive])
+
+        return self._output(0)
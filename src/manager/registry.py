@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class TaskRegistry:
+    """
+    任务登记表 (SQLite): 启动成功的任务写入，经接口停止时删除，服务重启后按表恢复
+    只保存任务规格 (task_id、流地址、任务参数)，运行状态不落盘
+    WAL + synchronous=NORMAL，每次提交不做 fsync，进程崩溃不丢已提交的数据
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' task_id TEXT PRIMARY KEY,'
+            ' input_url TEXT NOT NULL,'
+            ' options TEXT NOT NULL,'
+            ' created REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def add(self, specs):
+        """specs: [(task_id, input_url, options), ...]，整批一次提交"""
+        if not specs:
+            return
+        now = time.time()
+        rows = [(task_id, input_url, json.dumps(options or {}), now) for task_id, input_url, options in specs]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)', rows)
+
+    def remove(self, task_ids):
+        if not task_ids:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany('DELETE FROM tasks WHERE task_id = ?', [(task_id,) for task_id in task_ids])
+
+    def load(self):
+        """按登记顺序返回 [(task_id, input_url, options), ...]"""
+        with self.lock:
+            rows = self.conn.execute('SELECT task_id, input_url, options FROM tasks ORDER BY created, rowid').fetchall()
+        return [(task_id, input_url, json.loads(options)) for task_id, input_url, options in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,71 +1,99 @@
-import threading
-import time
-from enum import Enum
-from src.core.streamer import AiStreamer
-
-class TaskStatus(str, Enum):
-    INIT = "init"
-    RUNNING = "running"
-    STOPPED = "stopped"
-    ERROR = "error"
-
-class InferenceTask:
-    def __init__(self, task_id, input_url, config, detector, gpu_id, logger):
-        self.task_id = task_id
-        self.input_url = input_url
-        self.output_url = ""
-        self.cfg = config
-        self.detector = detector
-        self.gpu_id = gpu_id
-        self.logger = logger
-
-        self.status = TaskStatus.INIT
-        self.error_msg = None
-        self.start_time = None
-        
-
-        self.streamer = None
-        self.thread = None
-        self.stream=""
-
-    def start(self):
-        def _run():
-            try:
-                self.logger.info(f"[Task {self.task_id}] 启动")
-                self.status = TaskStatus.RUNNING
-                self.start_time = time.time()
-
-                self.streamer = AiStreamer(
-                    self.cfg,
-                    self.detector,
-                    self.logger,
-                    self.input_url,
-                    self.gpu_id
-                )
-                self.output_url=self.streamer.output_url
-                self.stream=self.streamer.stream
-                self.streamer.run()
-
-                if self.status != TaskStatus.STOPPED:
-                    self.status = TaskStatus.STOPPED
-
-            except Exception as e:
-                self.status = TaskStatus.ERROR
-                self.error_msg = str(e)
-                self.logger.error(f"[Task {self.task_id}] 异常: {e}")
-
-        self.thread = threading.Thread(target=_run, daemon=True)
-        self.thread.start()
-
-    def stop(self):
-        if self.streamer:
-            self.streamer.running = False
-        self.status = TaskStatus.STOPPED
-        self.logger.info(f"[Task {self.task_id}] 已停止")
-
-
-    def get_fps(self):
-        return self.streamer.fps
-
-    def get_heartbeat(self):
-        return self.streamer.last_heartbeat
\ No newline at end of file
+import threading
+import time
+from enum import Enum
+from src.core.streamer import AiStreamer, stream_name
+
+class TaskStatus(str, Enum):
+    INIT = "init"
+    RUNNING = "running"
+    STOPPED = "stopped"
+    ERROR = "error"
+
+class InferenceTask:
+    def __init__(self, task_id, input_url, config, detector, gpu_id, logger, options=None, publisher=None):
+        self.task_id = task_id
+        self.input_url = input_url
+        self.options = options or {}
+        self.output_url = ""
+        self.cfg = config
+        self.detector = detector
+        self.gpu_id = gpu_id
+        self.logger = logger
+        self.publisher = publisher
+
+        self.status = TaskStatus.INIT
+        self.error_msg = None
+        self.start_time = None
+        
+
+        self.streamer = None
+        self.thread = None
+        self.stream = stream_name(input_url)
+
+    def start(self):
+        def _run():
+            try:
+                self.logger.info(f"[Task {self.task_id}] 启动")
+                self.status = TaskStatus.RUNNING
+                self.start_time = time.time()
+
+                self.streamer = AiStreamer(
+                    self.cfg,
+                    self.detector,
+                    self.logger,
+                    self.input_url,
+                    self.gpu_id,
+                    self.options,
+                    self.publisher
+                )
+                self.output_url=self.streamer.output_url
+                self.stream=self.streamer.stream
+                self.streamer.run()
+
+                if self.status != TaskStatus.STOPPED:
+                    self.status = TaskStatus.STOPPED
+
+            except Exception as e:
+                self.status = TaskStatus.ERROR
+                self.error_msg = str(e)
+                self.logger.error(f"[Task {self.task_id}] 异常: {e}")
+
+        self.thread = threading.Thread(target=_run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.streamer:
+            self.streamer.running = False
+        self.status = TaskStatus.STOPPED
+        self.logger.info(f"[Task {self.task_id}] 已停止")
+
+
+    def migrate(self, detector, gpu_id):
+        """切换到另一个设备的推理后端，尚未创建 streamer 时启动后直接使用新的 detector"""
+        self.detector = detector
+        self.gpu_id = gpu_id
+        if self.streamer:
+            self.streamer.swap_detector(detector)
+        self.logger.info(f"[Task {self.task_id}] 推理迁移到 GPU[{gpu_id}]")
+
+    def get_fps(self):
+        return self.streamer.fps if self.streamer else 0
+
+    def get_heartbeat(self):
+        return self.streamer.last_heartbeat if self.streamer else None
+
+    def get_stats(self):
+        return dict(self.streamer.stats) if self.streamer else {}
+
+    def get_load(self):
+        """返回 (累计推理耗时 ms, 推理次数, 帧缓冲 MB)，供放置策略计算实测开销，尚未启动时返回 None"""
+        if not self.streamer:
+            return None
+        infer = self.streamer.metrics.stages['infer']
+        return infer.sum, infer.count, self.streamer.memory_bytes() / (1 << 20)
+
+    def get_metrics(self):
+        """返回 (StreamMetrics, 瞬时指标)，尚未启动时返回 None"""
+        if not self.streamer:
+            return None
+        return self.streamer.metrics, self.streamer.metric_gauges()
\ No newline at end of file
@@ -1,103 +1,431 @@
-import threading
-import uuid
-import time
-from src.manager.task import InferenceTask, TaskStatus
-
-class InferenceTaskManager:
-    def __init__(self, config, gpu_manager, logger, max_tasks_per_gpu=2):
-        self.cfg = config
-        self.gpu_manager = gpu_manager
-        self.logger = logger
-        self.max_tasks_per_gpu = max_tasks_per_gpu
-
-        self.tasks = {}
-        self.lock = threading.Lock()
-
-    def start_task(self, input_url):
-        with self.lock:
-            self.cleanup()
-            if not input_url.startswith("rtsp://"):
-                raise RuntimeError("流地址非法")
-            if self.url_exists(input_url):
-                raise RuntimeError("流地址已存在")
-
-            detector, gpu_id = self.gpu_manager.acquire()
-
-            if detector is None:
-                raise RuntimeError("没有可用 GPU 资源")
-
-            task_id = str(uuid.uuid4().hex)
-            task = InferenceTask(
-                task_id,
-                input_url,
-                self.cfg,
-                detector,
-                gpu_id,
-                self.logger
-            )
-
-            self.tasks[task_id] = task
-            task.start()
-
-            return task_id
-
-    def stop_task(self, task_id):
-        with self.lock:
-            task = self.tasks.get(task_id)
-            if not task:
-                return False
-
-            task.stop()
-            self.gpu_manager.release(task.gpu_id)
-            return True
-
-    def get_status(self, task_id,enbale=True):
-        if enbale:
-            self.cleanup()
-        task = self.tasks.get(task_id)
-        if not task:
-            return None
-
-        return {
-            "task_id": task.task_id,
-            "input_url": task.input_url,
-            "stream":task.stream,
-            "status": task.status,
-            "gpu_id": task.gpu_id,
-            "fps":task.get_fps(),
-            "uptime": time.time() - task.start_time if task.start_time else 0,
-            "last_heartbeat":task.get_heartbeat()
-        }
-
-    def list_tasks(self):
-        self.cleanup()
-        return [self.get_status(tid,False) for tid in self.tasks]
-
-    def cleanup_task(self, task_id):
-        task = self.tasks.pop(task_id, None)
-        if task:
-            self.gpu_manager.release(task.gpu_id)
-
-    def url_exists(self, input_url):
-        return any(self.tasks[task_id].input_url == input_url for task_id in self.tasks)
-
-    def cleanup(self):
-        for task_id in self.tasks.copy():  
-            if self.tasks[task_id].status in [TaskStatus.STOPPED, TaskStatus.ERROR]:
-                self.cleanup_task(task_id)
-                
-    def stop_all(self):
-        with self.lock:
-            task_ids = list(self.tasks.keys())
-            for task_id in task_ids:
-                task = self.tasks.get(task_id)
-                if not task:
-                    continue
-                try:
-                    task.stop()
-                except Exception as e:
-                    self.logger.error(f"停止任务失败 {task_id}: {e}")
-                self.gpu_manager.release(task.gpu_id)
-            self.tasks.clear()
-
-    
+import threading
+import uuid
+import time
+from types import MappingProxyType
+
+from src.core.streamer import stream_name
+from src.manager.task import InferenceTask, TaskStatus
+
+
+class StatusSnapshot:
+    """某一时刻所有任务状态的只读快照，发布后不再修改，读取方不加锁"""
+
+    def __init__(self, statuses):
+        self.statuses = MappingProxyType(statuses)
+        by_device, by_stream = {}, {}
+        for task_id, status in statuses.items():
+            by_device.setdefault(status['gpu_id'], []).append(task_id)
+            by_stream[status['stream']] = task_id
+        self.by_device = MappingProxyType({gpu_id: tuple(ids) for gpu_id, ids in by_device.items()})
+        self.by_stream = MappingProxyType(by_stream)
+        self.created = time.time()
+
+
+class InferenceTaskManager:
+    def __init__(self, config, gpu_manager, logger, publisher=None, registry=None):
+        self.cfg = config
+        self.gpu_manager = gpu_manager
+        self.logger = logger
+        # 旁路模式任务的检测结果发布器
+        self.publisher = publisher
+        # 任务登记表，为空时不持久化，重启后任务不恢复
+        self.registry = registry
+        self.restore_stats = None
+
+        self.tasks = {}
+        # 索引: 流地址 / 输出流名 -> task_id，设备 -> {task_id}，只在持有 self.lock 时修改
+        self.url_index = {}
+        self.stream_index = {}
+        self.device_index = {}
+        self.lock = threading.Lock()
+        self.running = True
+
+        # 状态查询只读快照: 定期整体刷新，启停时增量替换，/tasks、/status 不再加锁也不清理任务表
+        self.snapshot = StatusSnapshot({})
+        self.status_interval = float(config.get('tasks', {}).get('status_interval_s', 1.0))
+        threading.Thread(target=self._status_refresher, daemon=True).start()
+
+        # 自动负载均衡: 设备间剩余能力差距持续超过阈值时，把一个任务的推理迁移到最空闲的设备
+        self.rebalance_cfg = config.get('rebalance', {})
+        self.imbalance_count = 0
+        self.migrated_at = {}
+        if self.rebalance_cfg.get('enabled', False):
+            threading.Thread(target=self._rebalancer, daemon=True).start()
+
+    def start_task(self, input_url, options=None):
+        with self.lock:
+            self.cleanup()
+            # 先按各任务最新的实测开销更新设备负载，再选择设备
+            self.refresh_load()
+            task_id = self._start(input_url, options)
+            self._publish(changed=[task_id])
+            self._journal([(task_id, input_url, options)])
+            return task_id
+
+    def start_tasks(self, items):
+        """
+        批量启动: items 为 [(input_url, options), ...]，整批只加一次锁、清理和刷新负载一次
+        返回与 items 顺序一致的 [{input_url, success, task_id | msg}, ...]
+        """
+        results = []
+        with self.lock:
+            self.cleanup()
+            self.refresh_load()
+            for input_url, options in items:
+                try:
+                    task_id = self._start(input_url, options)
+                    results.append({"input_url": input_url, "success": True, "task_id": task_id})
+                except Exception as e:
+                    results.append({"input_url": input_url, "success": False, "msg": str(e)})
+            self._publish(changed=[r['task_id'] for r in results if r['success']])
+            self._journal([(r['task_id'], r['input_url'], options)
+                           for r, (_, options) in zip(results, items) if r['success']])
+        self.logger.info(f"批量启动 {len(items)} 个任务，成功 {sum(r['success'] for r in results)}")
+        return results
+
+    def _start(self, input_url, options=None):
+        """调用方持有 self.lock"""
+        if not input_url.startswith("rtsp://"):
+            raise RuntimeError("流地址非法")
+        task = self._admit(str(uuid.uuid4().hex), input_url, options)
+        task.start()
+        return task.task_id
+
+    def _admit(self, task_id, input_url, options=None):
+        """分配设备、登记索引，不启动任务，调用方持有 self.lock"""
+        if self.url_exists(input_url):
+            raise RuntimeError("流地址已存在")
+        stream = stream_name(input_url)
+        if stream in self.stream_index:
+            # 输出流名只取地址最后一段，不同地址也可能重名
+            raise RuntimeError(f"输出流名 {stream} 已被其他任务使用")
+
+        detector, gpu_id = self.gpu_manager.acquire(task_id, options)
+
+        if detector is None:
+            raise RuntimeError("没有可用 GPU 资源")
+
+        task = InferenceTask(
+            task_id,
+            input_url,
+            self.cfg,
+            detector,
+            gpu_id,
+            self.logger,
+            options,
+            self.publisher
+        )
+
+        self.tasks[task_id] = task
+        self.url_index[input_url] = task_id
+        self.stream_index[task.stream] = task_id
+        self.device_index.setdefault(gpu_id, set()).add(task_id)
+        return task
+
+    def _journal(self, specs):
+        """
+        启动成功的任务写入登记表，调用方持有 self.lock: 写入与 _unjournal 的删除不会交错，
+        停止的任务不会在下次启动时被恢复；写入失败只影响重启恢复，不影响任务本身
+        """
+        if self.registry is None or not specs:
+            return
+        try:
+            self.registry.add(specs)
+        except Exception as e:
+            self.logger.error(f"任务写入登记表失败: {e}")
+
+    def _unjournal(self, task_ids):
+        """
+        只有接口显式停止的任务才移出登记表，调用方持有 self.lock；
+        自行结束的任务 (断流、解码器被信号终止、服务关闭) 保留登记，下次启动时恢复
+        已被 cleanup 清理的任务再次显式停止时，同样移出其登记
+        """
+        if self.registry is None or not task_ids:
+            return
+        try:
+            self.registry.remove(task_ids)
+        except Exception as e:
+            self.logger.error(f"任务移出登记表失败 {list(task_ids)}: {e}")
+
+    def restore(self):
+        """
+        服务启动时按登记表恢复任务:
+        1. 先并行加载、预热各设备的模型，任务准入时不再在锁内加载模型
+        2. 整批分配设备、登记索引 (沿用原 task_id)，状态查询立即可见
+        3. 逐个启动，相邻两路间隔 stagger_ms，错开 FFmpeg 进程创建和拉流建连
+        4. 等待各路出第一帧或失败，最多 ready_timeout_s，统计耗时写入 restore_stats
+        """
+        if self.registry is None:
+            return None
+        cfg = self.cfg.get('registry', {})
+        stagger = float(cfg.get('stagger_ms', 20)) / 1000
+        ready_timeout = float(cfg.get('ready_timeout_s', 30))
+
+        t0 = time.perf_counter()
+        specs = self.registry.load()
+        stats = {'total': len(specs), 'restored': 0, 'ready': 0, 'failed': 0,
+                 'prewarm_s': 0.0, 'start_s': 0.0, 'ready_s': 0.0, 'elapsed_s': 0.0}
+        if not specs:
+            self.restore_stats = stats
+            return stats
+        self.logger.info(f"开始恢复 {len(specs)} 个任务")
+        stats['prewarm_s'] = self.gpu_manager.prewarm()
+
+        tasks, dropped = [], []
+        with self.lock:
+            self.refresh_load()
+            for task_id, input_url, options in specs:
+                if self.url_exists(input_url) or stream_name(input_url) in self.stream_index:
+                    # 地址或输出流名已被其他任务占用，这条登记不再保留
+                    self.logger.warning(f"[Task {task_id}] 流地址或输出流名已被占用，不再恢复: {input_url}")
+                    dropped.append(task_id)
+                    continue
+                try:
+                    tasks.append(self._admit(task_id, input_url, options))
+                except Exception as e:
+                    # 设备不足等原因，登记保留，下次启动再恢复
+                    self.logger.error(f"[Task {task_id}] 恢复失败 {input_url}: {e}")
+                    stats['failed'] += 1
+            self._publish(changed=[task.task_id for task in tasks])
+        self.registry.remove(dropped)
+        stats['restored'] = len(tasks)
+
+        t1 = time.perf_counter()
+        for i, task in enumerate(tasks):
+            if i:
+                time.sleep(stagger)
+            with self.lock:
+                # 恢复期间可能已被停止
+                if self.tasks.get(task.task_id) is task and task.status == TaskStatus.INIT:
+                    task.start()
+        stats['start_s'] = time.perf_counter() - t1
+
+        pending = set(tasks)
+        deadline = time.perf_counter() + ready_timeout
+        while pending and time.perf_counter() < deadline:
+            for task in list(pending):
+                streamer = task.streamer
+                if streamer is not None and streamer.metrics.frames > 0:
+                    stats['ready'] += 1
+                    pending.discard(task)
+                elif task.status in (TaskStatus.STOPPED, TaskStatus.ERROR):
+                    stats['failed'] += 1
+                    pending.discard(task)
+            time.sleep(0.05)
+        stats['failed'] += len(dropped)
+        stats['ready_s'] = time.perf_counter() - t1
+        stats['elapsed_s'] = time.perf_counter() - t0
+        self.restore_stats = stats
+        self.logger.info(
+            f"任务恢复完成: 共 {stats['total']}，恢复 {stats['restored']}，出帧 {stats['ready']}，"
+            f"失败 {stats['failed']}，未就绪 {len(pending)}；预热 {stats['prewarm_s']:.2f}s，"
+            f"启动 {stats['start_s']:.2f}s，全部出帧 {stats['ready_s']:.2f}s，总耗时 {stats['elapsed_s']:.2f}s"
+        )
+        return stats
+
+    def stop_task(self, task_id):
+        with self.lock:
+            stopped = self._stop(task_id)
+            self._publish(removed=[task_id])
+            self._unjournal([task_id])
+            return stopped
+
+    def stop_tasks(self, task_ids):
+        """批量停止，返回 [{task_id, success}, ...]"""
+        with self.lock:
+            results = [{"task_id": task_id, "success": self._stop(task_id)} for task_id in task_ids]
+            self._publish(removed=task_ids)
+            self._unjournal(task_ids)
+        self.logger.info(f"批量停止 {len(task_ids)} 个任务，成功 {sum(r['success'] for r in results)}")
+        return results
+
+    def _stop(self, task_id):
+        """调用方持有 self.lock"""
+        task = self.tasks.get(task_id)
+        if not task:
+            return False
+
+        task.stop()
+        # 立即移出并释放资源，避免后续 cleanup 重复释放
+        self.cleanup_task(task_id)
+        return True
+
+    def migrate_task(self, task_id, gpu_id=None):
+        """把运行中任务的推理迁移到 gpu_id (为空时自动选择)，解码和推流不中断，返回 (原设备, 目标设备)"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if not task or task.status not in (TaskStatus.INIT, TaskStatus.RUNNING):
+                raise RuntimeError("任务不存在")
+            if gpu_id is not None and gpu_id == task.gpu_id:
+                raise RuntimeError("任务已在该设备上")
+            self.refresh_load()
+            moved = self.gpu_manager.migrate(task_id, gpu_id)
+            if moved is None:
+                raise RuntimeError("没有可迁移的目标设备或目标设备剩余能力不足")
+            detector, source, target = moved
+            task.migrate(detector, target)
+            self.device_index[source].discard(task_id)
+            self.device_index.setdefault(target, set()).add(task_id)
+            self.migrated_at[task_id] = time.monotonic()
+            self._publish(changed=[task_id])
+            return source, target
+
+    def _rebalancer(self):
+        interval = float(self.rebalance_cfg.get('interval_s', 10))
+        while self.running:
+            time.sleep(interval)
+            try:
+                self.rebalance_once()
+            except Exception as e:
+                self.logger.error(f"负载均衡异常: {e}")
+
+    def rebalance_once(self):
+        """检查一次负载，连续 sustain 次失衡才迁移，同一任务迁移后 cooldown_s 内不再迁移"""
+        cfg = self.rebalance_cfg
+        self.refresh_load()
+        plan = self.gpu_manager.plan_rebalance(float(cfg.get('threshold', 0.3)))
+        if plan is None:
+            self.imbalance_count = 0
+            return None
+        self.imbalance_count += 1
+        task_id, source, target = plan
+        if self.imbalance_count < int(cfg.get('sustain', 3)):
+            return None
+        if time.monotonic() - self.migrated_at.get(task_id, float('-inf')) < float(cfg.get('cooldown_s', 60)):
+            return None
+        self.imbalance_count = 0
+        self.logger.info(f"设备负载持续失衡，迁移任务 {task_id}: GPU[{source}] -> GPU[{target}]")
+        return self.migrate_task(task_id, target)
+
+    def _status_refresher(self):
+        while self.running:
+            time.sleep(self.status_interval)
+            try:
+                self.refresh_snapshot()
+            except Exception as e:
+                self.logger.error(f"刷新任务状态异常: {e}")
+
+    def refresh_snapshot(self):
+        """清理已结束的任务并整体重建状态快照，逐个任务取状态时不持有锁"""
+        with self.lock:
+            self.cleanup()
+            tasks = dict(self.tasks)
+        statuses = {task_id: self._status(task) for task_id, task in tasks.items()}
+        with self.lock:
+            # 构建期间启停的任务以当前任务表为准
+            for task_id in statuses.keys() - self.tasks.keys():
+                del statuses[task_id]
+            for task_id in self.tasks.keys() - statuses.keys():
+                statuses[task_id] = self._status(self.tasks[task_id])
+            self.snapshot = StatusSnapshot(statuses)
+
+    def _publish(self, changed=(), removed=()):
+        """启停、迁移后增量替换快照，调用方持有 self.lock"""
+        statuses = dict(self.snapshot.statuses)
+        for task_id in removed:
+            statuses.pop(task_id, None)
+        for task_id in changed:
+            if task_id in self.tasks:
+                statuses[task_id] = self._status(self.tasks[task_id])
+        self.snapshot = StatusSnapshot(statuses)
+
+    def _status(self, task):
+        return {
+            "task_id": task.task_id,
+            "input_url": task.input_url,
+            "stream":task.stream,
+            "status": task.status,
+            "gpu_id": task.gpu_id,
+            "options": task.options,
+            "fps":task.get_fps(),
+            "uptime": time.time() - task.start_time if task.start_time else 0,
+            "last_heartbeat":task.get_heartbeat(),
+            "metrics":task.get_stats()
+        }
+
+    def get_status(self, task_id):
+        return self.snapshot.statuses.get(task_id)
+
+    def list_tasks(self, gpu_id=None, stream=None):
+        """按设备或输出流名过滤，读同一个快照，结果前后一致"""
+        snapshot = self.snapshot
+        if stream is not None:
+            task_ids = [snapshot.by_stream[stream]] if stream in snapshot.by_stream else []
+            if gpu_id is not None:
+                task_ids = [tid for tid in task_ids if snapshot.statuses[tid]['gpu_id'] == gpu_id]
+        elif gpu_id is not None:
+            task_ids = snapshot.by_device.get(gpu_id, ())
+        else:
+            return list(snapshot.statuses.values())
+        return [snapshot.statuses[tid] for tid in task_ids]
+
+    def get_statuses(self, task_ids):
+        """批量查询，不存在的任务为 None"""
+        statuses = self.snapshot.statuses
+        return {task_id: statuses.get(task_id) for task_id in task_ids}
+
+    def collect_metrics(self):
+        """供 /metrics 使用: 返回 (各任务指标, 各设备指标)"""
+        self.refresh_load()
+        with self.lock:
+            tasks = list(self.tasks.values())
+        streams = []
+        for task in tasks:
+            collected = task.get_metrics()
+            if collected is None:
+                continue
+            metrics, gauges = collected
+            labels = {'task': task.task_id, 'stream': task.stream, 'device': task.gpu_id}
+            streams.append((labels, metrics, gauges))
+        return streams, self.gpu_manager.device_metrics()
+
+    def refresh_load(self):
+        """把各任务实测的推理开销和内存上报给设备管理，调用方可能已持有 self.lock，这里不加锁"""
+        for task in list(self.tasks.values()):
+            load = task.get_load()
+            if load is not None:
+                self.gpu_manager.update_load(task.task_id, *load)
+
+    def cleanup_task(self, task_id):
+        task = self.tasks.pop(task_id, None)
+        self.migrated_at.pop(task_id, None)
+        if task:
+            if self.url_index.get(task.input_url) == task_id:
+                del self.url_index[task.input_url]
+            if self.stream_index.get(task.stream) == task_id:
+                del self.stream_index[task.stream]
+            self.device_index.get(task.gpu_id, set()).discard(task_id)
+            self.gpu_manager.release(task.gpu_id, task_id)
+
+    def url_exists(self, input_url):
+        return input_url in self.url_index
+
+    def cleanup(self):
+        """调用方持有 self.lock"""
+        for task_id in self.tasks.copy():  
+            if self.tasks[task_id].status in [TaskStatus.STOPPED, TaskStatus.ERROR]:
+                self.cleanup_task(task_id)
+                
+    def stop_all(self):
+        self.running = False
+        with self.lock:
+            task_ids = list(self.tasks.keys())
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if not task:
+                    continue
+                try:
+                    task.stop()
+                except Exception as e:
+                    self.logger.error(f"停止任务失败 {task_id}: {e}")
+                self.gpu_manager.release(task.gpu_id, task_id)
+            self.tasks.clear()
+            self.url_index.clear()
+            self.stream_index.clear()
+            self.device_index.clear()
+            self.snapshot = StatusSnapshot({})
+        # 服务关闭停止的任务保留在登记表中，下次启动时恢复
+        if self.registry is not None:
+            self.registry.close()
+
+    
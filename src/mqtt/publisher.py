@@ -0,0 +1,58 @@
+import json
+import threading
+
+from src.mqtt.topics import AI_DETECTIONS
+
+
+class DetectionPublisher:
+    """
+    供处理线程调用的 MQTT 发布器: 序列化在调用线程完成，
+    真正的 publish 通过 call_soon_threadsafe 交给事件循环执行 (MQTT 客户端不是线程安全的)
+    事件循环积压超过 max_pending 条时直接丢弃，不阻塞处理线程
+    """
+
+    def __init__(self, mqtt, loop, logger, topic=AI_DETECTIONS, qos=0, max_pending=1000):
+        self.mqtt = mqtt
+        self.loop = loop
+        self.logger = logger
+        self.topic = topic
+        self.qos = qos
+        self.max_pending = max_pending
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def publish(self, stream, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending += 1
+        try:
+            self.loop.call_soon_threadsafe(self._send, self.topic.format(stream=stream), data)
+        except RuntimeError:
+            # 事件循环已关闭 (服务退出中)
+            with self.lock:
+                self.pending -= 1
+                self.dropped += 1
+            return False
+        return True
+
+    def _send(self, topic, data):
+        try:
+            self.mqtt.publish(topic, data, qos=self.qos)
+            ok = True
+        except Exception as e:
+            ok = False
+            if self.failed % 100 == 0:
+                self.logger.error(f"MQTT 发布检测结果失败: {e}")
+        with self.lock:
+            self.pending -= 1
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
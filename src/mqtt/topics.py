@@ -1 +1,4 @@
 DEVICE_OSD = "thing/product/+/osd"
+
+# 旁路模式检测结果，{stream} 为任务的流名
+AI_DETECTIONS = "aistream/{stream}/detections"
@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from src.utils.yuv import rgb_to_yuv, split_planes
 
 class Drawer:
     def __init__(self, cfg):
@@ -15,41 +16,190 @@ class Drawer:
         # OpenCV 字体缩放比例
         self.font_scale = 0.6 
 
+        # 管道为 YUV 时直接在 Y/UV 平面上绘制
+        self.pix_fmt = cfg.get('video', {}).get('pix_fmt', 'rgb24')
+        y, u, v = rgb_to_yuv(self.color_bgr)
+        self.color_y = y
+        self.color_uv = (u, v)
+
     def draw_detections(self, frame, detections, scale, pad_w, pad_h):
         """
         frame: numpy ndarray (BGR 格式)
-        detections: 推理结果 [x1, y1, x2, y2, conf, cls_id]
+        detections: 推理结果 [x1, y1, x2, y2, conf, cls_id(, track_id)]
         """
         if len(detections) == 0:
             return frame
 
         h_img, w_img = frame.shape[:2]
+        yuv = self.pix_fmt != 'rgb24'
+        if yuv:
+            h_img = h_img * 2 // 3
+            y_plane, chroma = split_planes(frame, h_img, w_img, self.pix_fmt)
 
         for det in detections:
             if len(det) >= 6:
-                x1, y1, x2, y2, conf, cls_id = det
+                conf, cls_id = det[4:6]
+                # 跟踪器输出的第 7 个值为轨迹 ID
+                track_id = det[6] if len(det) > 6 else None
                 
                 # --- 1. 坐标还原 ---
-                orig_x1 = max(0, int((x1 - pad_w) / scale))
-                orig_y1 = max(0, int((y1 - pad_h) / scale))
-                orig_x2 = min(w_img, int((x2 - pad_w) / scale))
-                orig_y2 = min(h_img, int((y2 - pad_h) / scale))
+                orig_x1, orig_y1, orig_x2, orig_y2 = self._box(det, scale, pad_w, pad_h, w_img, h_img)
                 
                 # --- 2. 绘制矩形框 (原地修改内存) ---
-                cv2.rectangle(frame, (orig_x1, orig_y1), (orig_x2, orig_y2), 
-                              self.color_bgr, self.thickness)
+                if yuv:
+                    self._rectangle_yuv(y_plane, chroma, orig_x1, orig_y1, orig_x2, orig_y2)
+                else:
+                    cv2.rectangle(frame, (orig_x1, orig_y1), (orig_x2, orig_y2), 
+                                  self.color_bgr, self.thickness)
 
                 # --- 3. 绘制英文标签与置信度 ---
-                idx = int(cls_id)
-                name = self.label_list[idx] if idx < len(self.label_list) else f"ID:{idx}"
-                label_text = f"{name} {conf:.2f}"
+                label_text = self._label_text(cls_id, conf, track_id)
                 
                 # 文本背景（可选，增加可读性）
                 # (t_w, t_h), _ = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
                 # cv2.rectangle(frame, (orig_x1, orig_y1 - t_h - 5), (orig_x1 + t_w, orig_y1), self.color_bgr, -1)
                 
-                # 直接绘制文字
-                cv2.putText(frame, label_text, (orig_x1, max(0, orig_y1 - 5)), 
-                            cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (255, 255, 255), 1)
+                # 直接绘制文字 (YUV 只写亮度，白字)
+                if yuv:
+                    cv2.putText(y_plane, label_text, (orig_x1, max(0, orig_y1 - 5)),
+                                cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 235, 1)
+                else:
+                    cv2.putText(frame, label_text, (orig_x1, max(0, orig_y1 - 5)), 
+                                cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (255, 255, 255), 1)
+
+        return frame
+
+    def draw_layer(self, layer, detections, scale, pad_w, pad_h, ratio=1.0):
+        """
+        在全透明的 RGBA 图层上绘制，由 FFmpeg 放大后叠加到原图
+        layer 为原图按 ratio 缩小后的尺寸，scale 已折算到图层坐标，线宽和字号同比缩小
+        """
+        h_img, w_img = layer.shape[:2]
+        color = (*self.color_bgr, 255)
+        thickness = max(1, int(round(self.thickness * ratio)))
+        font_scale = self.font_scale * ratio
+        for det in detections:
+            if len(det) < 6:
+                continue
+            x1, y1, x2, y2, conf, cls_id = det[:6]
+            track_id = det[6] if len(det) > 6 else None
+            lx1 = max(0, int((x1 - pad_w) / scale))
+            ly1 = max(0, int((y1 - pad_h) / scale))
+            lx2 = min(w_img, int((x2 - pad_w) / scale))
+            ly2 = min(h_img, int((y2 - pad_h) / scale))
+            cv2.rectangle(layer, (lx1, ly1), (lx2, ly2), color, thickness)
+            cv2.putText(layer, self._label_text(cls_id, conf, track_id), (lx1, max(0, ly1 - 3)),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255, 255), 1)
+        return layer
+
+    def _box(self, det, scale, pad_w, pad_h, w_img, h_img):
+        x1, y1, x2, y2 = det[:4]
+        return (max(0, int((x1 - pad_w) / scale)), max(0, int((y1 - pad_h) / scale)),
+                min(w_img, int((x2 - pad_w) / scale)), min(h_img, int((y2 - pad_h) / scale)))
+
+    def _label_text(self, cls_id, conf, track_id=None):
+        idx = int(cls_id)
+        name = self.label_list[idx] if idx < len(self.label_list) else f"ID:{idx}"
+        label_text = f"{name} {conf:.2f}"
+        if track_id is not None:
+            label_text = f"#{track_id} {label_text}"
+        return label_text
+
+    def _rectangle_yuv(self, y_plane, chroma, x1, y1, x2, y2):
+        # 亮度按原线宽绘制，色度平面为半分辨率，坐标减半、线宽取 1
+        cv2.rectangle(y_plane, (x1, y1), (x2, y2), self.color_y, self.thickness)
+        p1, p2 = (x1 // 2, y1 // 2), (x2 // 2, y2 // 2)
+        if len(chroma) == 1:
+            cv2.rectangle(chroma[0], p1, p2, self.color_uv, max(1, self.thickness // 2))
+        else:
+            cv2.rectangle(chroma[0], p1, p2, self.color_uv[0], max(1, self.thickness // 2))
+            cv2.rectangle(chroma[1], p1, p2, self.color_uv[1], max(1, self.thickness // 2))
+
+class OverlayCache:
+    """
+    检测结果叠加层缓存: 检测结果变化时才重画，记下被画到的像素位置和值，
+    之后每帧只把这些像素写回帧缓冲，推理间隔内复用检测结果的帧几乎不再有绘制开销
+    shape 为管道帧的形状 (rgb24 或 YUV 单平面布局)；框线与 draw_detections 逐像素一致，
+    文字边缘有抗锯齿，按覆盖率与底图混合，误差不超过 2
+    """
+
+    def __init__(self, drawer, shape):
+        self.drawer = drawer
+        # 同样的图元分别画在全 0 和全 255 的画布上: 两者相同的像素被完全覆盖，
+        # 差值小于 255 的是抗锯齿边缘，差值/255 即底图保留的比例
+        self.canvas = np.zeros(shape, dtype=np.uint8)
+        self.marker = np.full(shape, 255, dtype=np.uint8)
+        self.diff = np.empty(shape, dtype=np.uint8)
+        self.h, self.w = shape[:2]
+        if drawer.pix_fmt != 'rgb24':
+            self.h = self.h * 2 // 3
+        # 标签文字画在框上方，连同线宽留出的行数
+        (_, th), _ = cv2.getTextSize('Ag', cv2.FONT_HERSHEY_SIMPLEX, drawer.font_scale, 1)
+        self.margin = drawer.thickness + 2
+        self.label_height = th + 5 + self.margin
+        self.solid = self.blend = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.uint8))
+        self.weight = np.empty(0, dtype=np.uint16)
+        self.bands = []
+        self.detections = None
+        self.geometry = None
+        self.renders = 0
+
+    def update(self, detections, scale, pad_w, pad_h):
+        """检测结果或坐标还原参数变化时重画，返回是否重画"""
+        geometry = (scale, pad_w, pad_h)
+        if geometry == self.geometry and (detections is self.detections or (
+                len(detections) == len(self.detections) and np.array_equal(detections, self.detections))):
+            return False
+        self.detections, self.geometry = detections, geometry
+        canvas, marker, diff = self.canvas.reshape(-1), self.marker.reshape(-1), self.diff.reshape(-1)
+        row = canvas.size // self.canvas.shape[0]
+        # 只擦除上次画过的行
+        for r0, r1 in self.bands:
+            canvas[r0 * row:r1 * row] = 0
+            marker[r0 * row:r1 * row] = 255
+        self.drawer.draw_detections(self.canvas, detections, scale, pad_w, pad_h)
+        self.drawer.draw_detections(self.marker, detections, scale, pad_w, pad_h)
+
+        # 只比较框和标签覆盖的行，单平面布局下每个平面的这些行都是连续内存
+        self.bands = self._bands(detections, scale, pad_w, pad_h)
+        solid, blend = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)]
+        for r0, r1 in self.bands:
+            a, b = r0 * row, r1 * row
+            d = cv2.absdiff(marker[a:b], canvas[a:b], dst=diff[a:b])
+            solid.append(np.flatnonzero(d == 0) + a)
+            # 差值 1~254: 抗锯齿边缘
+            blend.append(np.flatnonzero(d - np.uint8(1) < 254) + a)
+        solid, blend = np.concatenate(solid), np.concatenate(blend)
+        self.solid = solid, canvas[solid]
+        self.blend = blend, canvas[blend]
+        self.weight = diff[blend].astype(np.uint16)
+        self.renders += 1
+        return True
+
+    def _bands(self, detections, scale, pad_w, pad_h):
+        """[(起始行, 结束行)]，按管道帧的单平面布局"""
+        rows = [y for det in detections if len(det) >= 6
+                for y in self.drawer._box(det, scale, pad_w, pad_h, self.w, self.h)[1::2]]
+        if not rows:
+            return []
+        r0 = min(self.h, max(0, min(rows) - self.label_height))
+        r1 = min(self.h, max(0, max(rows) + self.margin))
+        if self.drawer.pix_fmt == 'rgb24':
+            return [(r0, r1)]
+        h = self.h
+        if self.drawer.pix_fmt == 'nv12':
+            return [(r0, r1), (h + r0 // 2, h + -(-r1 // 2))]
+        # yuv420p: U、V 平面各 h/4 行，每行放两行色度
+        q = h // 4
+        return [(r0, r1), (h + r0 // 4, h + -(-r1 // 4)), (h + q + r0 // 4, h + q + -(-r1 // 4))]
 
-        return frame
\ No newline at end of file
+    def composite(self, frame):
+        """把缓存的像素写回帧缓冲 (连续内存，原地修改)"""
+        flat = frame.reshape(-1)
+        index, values = self.solid
+        if index.size:
+            flat[index] = values
+        index, values = self.blend
+        if index.size:
+            flat[index] = values + (flat[index] * self.weight + 127) // 255
+        return frame
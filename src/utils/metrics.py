@@ -0,0 +1,146 @@
+from bisect import bisect_left
+
+# 耗时直方图桶上界 (ms)，覆盖 0.1ms ~ 5s
+LATENCY_BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 40, 50, 75,
+    100, 150, 200, 300, 500, 1000, 2000, 5000,
+)
+
+STAGES = ('queue', 'infer', 'draw', 'write', 'total', 'latency')
+
+
+class Histogram:
+    """
+    固定桶直方图，累计值 (Prometheus 语义)
+    每个实例只由一个线程 (处理线程) 写入，observe 不加锁；读取方拷贝后计算，
+    读到的 counts/sum/count 之间可能差一次观测，对监控无影响
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return list(self.counts), self.sum, self.count
+
+    def merge(self, other):
+        counts, total, count = other.snapshot()
+        for i, c in enumerate(counts):
+            self.counts[i] += c
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q):
+        """桶内线性插值估算分位数，无数据返回 0"""
+        counts, _, count = self.snapshot()
+        if count == 0:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c > 0:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+
+class StreamMetrics:
+    """单路流的各阶段耗时直方图与计数器，由 AiStreamer 的读/处理线程各自写入自己负责的字段"""
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.frames = 0
+        self.drops = 0
+        self.infers = 0
+        self.decoder_starts = 0
+        self.reconnects = 0
+
+    def observe(self, stage, value):
+        self.stages[stage].observe(value)
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """{stage: [p50, p95, p99]}，用于任务状态接口"""
+        return {
+            stage: [round(h.quantile(q), 2) for q in qs]
+            for stage, h in self.stages.items() if h.count
+        }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _write_histogram(lines, name, labels, hist):
+    counts, total, count = hist.snapshot()
+    cumulative = 0
+    for bound, c in zip(hist.bounds, counts):
+        cumulative += c
+        lines.append(f'{name}_bucket{{{_labels({**labels, "le": bound})}}} {cumulative}')
+    lines.append(f'{name}_bucket{{{_labels({**labels, "le": "+Inf"})}}} {count}')
+    lines.append(f'{name}_sum{{{_labels(labels)}}} {total:.3f}')
+    lines.append(f'{name}_count{{{_labels(labels)}}} {count}')
+
+
+def render_prometheus(streams, devices=()):
+    """
+    streams: [(labels dict, StreamMetrics, extra gauges dict), ...]，labels 至少包含 device
+    devices: [(labels dict, gauges dict), ...] 设备级别的附加指标
+    返回 Prometheus 文本格式
+    """
+    lines = []
+
+    lines.append('# HELP aistream_stage_ms Per-task stage latency in milliseconds')
+    lines.append('# TYPE aistream_stage_ms histogram')
+    per_device = {}
+    for labels, metrics, _ in streams:
+        for stage, hist in metrics.stages.items():
+            _write_histogram(lines, 'aistream_stage_ms', {**labels, 'stage': stage}, hist)
+            merged = per_device.setdefault((str(labels['device']), stage), Histogram())
+            merged.merge(hist)
+
+    lines.append('# HELP aistream_device_stage_ms Stage latency aggregated over all tasks of a device')
+    lines.append('# TYPE aistream_device_stage_ms histogram')
+    for (device, stage), hist in sorted(per_device.items()):
+        _write_histogram(lines, 'aistream_device_stage_ms', {'device': device, 'stage': stage}, hist)
+
+    counters = (
+        ('frames', 'Frames processed'),
+        ('drops', 'Frames dropped before processing'),
+        ('infers', 'Inference calls'),
+        ('decoder_starts', 'FFmpeg decoder process starts'),
+        ('reconnects', 'Successful reconnects after a signal loss'),
+    )
+    for field, help_text in counters:
+        lines.append(f'# HELP aistream_{field}_total {help_text}')
+        lines.append(f'# TYPE aistream_{field}_total counter')
+        for labels, metrics, _ in streams:
+            lines.append(f'aistream_{field}_total{{{_labels(labels)}}} {getattr(metrics, field)}')
+
+    gauge_names = sorted({name for _, _, gauges in streams for name in gauges})
+    for name in gauge_names:
+        lines.append(f'# TYPE aistream_{name} gauge')
+        for labels, _, gauges in streams:
+            if name in gauges:
+                lines.append(f'aistream_{name}{{{_labels(labels)}}} {float(gauges[name])}')
+
+    device_gauges = sorted({name for _, gauges in devices for name in gauges})
+    for name in device_gauges:
+        lines.append(f'# TYPE aistream_device_{name} gauge')
+        for labels, gauges in devices:
+            if name in gauges:
+                lines.append(f'aistream_device_{name}{{{_labels(labels)}}} {float(gauges[name])}')
+
+    return '\n'.join(lines) + '\n'
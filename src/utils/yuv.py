@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+# 管道中可用的像素格式，YUV 为 4:2:0 (每像素 1.5 字节)，按 OpenCV 的单平面布局存放: 高 h*3/2，宽 w
+PIPE_FORMATS = ('rgb24', 'yuv420p', 'nv12')
+
+TO_RGB = {
+    'yuv420p': cv2.COLOR_YUV2RGB_I420,
+    'nv12': cv2.COLOR_YUV2RGB_NV12,
+}
+
+
+def frame_shape(h, w, pix_fmt):
+    if pix_fmt == 'rgb24':
+        return (h, w, 3)
+    return (h * 3 // 2, w)
+
+
+def split_planes(buf, h, w, pix_fmt):
+    """
+    返回 (Y 平面, [色度平面...])，均为 buf 的视图
+    yuv420p: [U, V] 各 (h/2, w/2)；nv12: [UV] (h/2, w/2, 2)
+    """
+    y = buf[:h]
+    if pix_fmt == 'nv12':
+        return y, [buf[h:].reshape(h // 2, w // 2, 2)]
+    q = h // 4
+    return y, [buf[h:h + q].reshape(h // 2, w // 2), buf[h + q:].reshape(h // 2, w // 2)]
+
+
+def rgb_to_yuv(color):
+    """RGB 颜色 -> BT.601 有限范围 (Y, U, V)，与 FFmpeg 默认转换一致"""
+    r, g, b = (c / 255.0 for c in color)
+    y = 16 + 65.481 * r + 128.553 * g + 24.966 * b
+    u = 128 - 37.797 * r - 74.203 * g + 112.0 * b
+    v = 128 + 112.0 * r - 93.786 * g - 18.214 * b
+    return int(round(y)), int(round(u)), int(round(v))
+
+
+class YuvDownscaler:
+    """
+    只把缩小后的 YUV 帧转成 RGB 供推理: 先按平面缩放到目标尺寸再做色彩转换，
+    全分辨率帧不做 RGB 转换，缓冲预分配复用
+    """
+
+    def __init__(self, h, w, size, pix_fmt):
+        # 4:2:0 单平面布局要求高是 4 的倍数、宽是 2 的倍数
+        self.sw = min(w, max(4, size[0] // 2 * 2))
+        self.sh = min(h, max(4, size[1] // 4 * 4))
+        self.h, self.w, self.pix_fmt = h, w, pix_fmt
+        self.small = np.empty(frame_shape(self.sh, self.sw, pix_fmt), dtype=np.uint8)
+        self.rgb = np.empty((self.sh, self.sw, 3), dtype=np.uint8)
+        self.small_planes = split_planes(self.small, self.sh, self.sw, pix_fmt)
+        # 检测框还原到原图时需要乘上的比例
+        self.ratio = self.sw / w
+
+    def __call__(self, buf):
+        y, chroma = split_planes(buf, self.h, self.w, self.pix_fmt)
+        sy, schroma = self.small_planes
+        cv2.resize(y, (self.sw, self.sh), dst=sy, interpolation=cv2.INTER_AREA)
+        for src, dst in zip(chroma, schroma):
+            cv2.resize(src, (self.sw // 2, self.sh // 2), dst=dst, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, TO_RGB[self.pix_fmt], dst=self.rgb)
+        return self.rgb